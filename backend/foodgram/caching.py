@@ -0,0 +1,203 @@
+import json
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from hashlib import md5
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from foodgram import settings
+
+HIT = 'hit'
+MISS = 'miss'
+NOT_MODIFIED = 'not_modified'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def count(namespace, outcome):
+    with _stats_lock:
+        _stats[namespace, outcome] += 1
+
+
+def get_cache_stats():
+    """
+    Попадания и промахи кеша ответов в этом процессе по пространствам
+    имён.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    result = {}
+    for (namespace, outcome), value in sorted(stats.items()):
+        result.setdefault(namespace, {HIT: 0, MISS: 0, NOT_MODIFIED: 0})
+        result[namespace][outcome] = value
+    for values in result.values():
+        total = sum(values.values())
+        values['hit_rate'] = round((total - values[MISS]) / total, 3)
+    return result
+
+
+def get_version(namespace):
+    """
+    Текущая версия данных пространства имён.
+
+    Версия хранится в том же кеше, что и ответы; если её вытеснили,
+    новая берётся от текущего времени и не совпадает с прежними.
+    """
+    key = f'version:{namespace}'
+    version = cache.get(key)
+    if version is not None:
+        return version
+    cache.add(key, int(time.time() * 1000), None)
+    return cache.get(key)
+
+
+def get_versions(namespaces):
+    """
+    Версии нескольких пространств имён одним обращением к кешу.
+    """
+    keys = {f'version:{namespace}': namespace for namespace in namespaces}
+    versions = {
+        keys[key]: version
+        for key, version in cache.get_many(list(keys)).items()
+    }
+    for namespace in keys.values():
+        if namespace not in versions:
+            versions[namespace] = get_version(namespace)
+    return versions
+
+
+def bump_version(namespace):
+    """
+    Делает устаревшими все закешированные ответы пространства имён.
+    """
+    key = f'version:{namespace}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def get_request_key(request):
+    """
+    Ключ ответа. Ссылки в ответах абсолютные, поэтому в ключ входят
+    схема и хост: иначе запрос с подменённым Host отравил бы кеш для
+    всех.
+    """
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+        if name != 'format'
+    )
+    return md5(
+        f'{request.accepted_media_type}:{request.scheme}://'
+        f'{request.get_host()}{request.path}?{params}'.encode()
+    ).hexdigest()
+
+
+def get_etag(request, data):
+    content = json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=False, sort_keys=True,
+    )
+    version = f'{request.accepted_media_type}:{content}'
+    return '"{}"'.format(md5(version.encode()).hexdigest())
+
+
+def set_cache_headers(response, etag, outcome, vary):
+    response['ETag'] = etag
+    response['Cache-Control'] = settings.RESPONSE_CACHE_CONTROL
+    response['Vary'] = vary
+    response['X-Cache'] = outcome.upper()
+    return response
+
+
+def wait_for_entry(key):
+    deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(settings.RESPONSE_CACHE_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_build(key, request, build, timeout):
+    """
+    Запись кеша (ETag, данные) или новый ответ, если записи нет.
+
+    Ответ строит только тот запрос, который первым взял блокировку;
+    остальные ждут, пока он положит запись в кеш.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        return None, entry, HIT
+    lock = f'lock:{key}'
+    locked = cache.add(lock, True, settings.RESPONSE_CACHE_LOCK_TIMEOUT)
+    if not locked:
+        entry = wait_for_entry(key)
+        if entry is not None:
+            return None, entry, HIT
+    try:
+        response = build()
+        if response.status_code != 200:
+            return response, None, MISS
+        entry = get_etag(request, response.data), response.data
+        cache.set(key, entry, timeout)
+    finally:
+        if locked:
+            cache.delete(lock)
+    return response, entry, MISS
+
+
+def respond(request, namespace, vary, response, entry, outcome):
+    """
+    Ответ из записи кеша: 304, если ETag совпал с If-None-Match.
+    """
+    if entry is None:
+        return response
+    etag, data = entry
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None and outcome == HIT:
+        outcome = NOT_MODIFIED
+    count(namespace.split(':')[0], outcome)
+    return set_cache_headers(
+        not_modified or response or Response(data), etag, outcome, vary,
+    )
+
+
+def cached_response(namespace, anonymous_only=False, timeout=None):
+    """
+    Кеширует данные успешных ответов действия по версии пространства
+    имён и параметрам запроса и отвечает 304 на If-None-Match.
+
+    Версия повышается сигналами при изменении данных, поэтому
+    устаревшие ответы не удаляются, а перестают находиться.
+    namespace может быть функцией от аргументов действия. timeout
+    ограничивает срок жизни ответов, данные которых меняются без
+    повышения версии; по умолчанию RESPONSE_CACHE_TIMEOUT.
+    """
+    vary = 'Accept, Authorization' if anonymous_only else 'Accept'
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if anonymous_only and request.user.is_authenticated:
+                return method(self, request, *args, **kwargs)
+            name = namespace(**kwargs) if callable(namespace) else namespace
+            key = 'response:{}:{}:{}'.format(
+                name, get_version(name), get_request_key(request)
+            )
+            return respond(request, name, vary, *get_or_build(
+                key,
+                request,
+                lambda: method(self, request, *args, **kwargs),
+                timeout or settings.RESPONSE_CACHE_TIMEOUT,
+            ))
+        return wrapper
+    return decorator
@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import wraps
+
+from django.db import connections
+
+from foodgram import settings
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class RequestMetrics:
+    """
+    Показатели одного запроса: число и время SQL-запросов, время
+    представления, сериализаторов и отрисовки ответа.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.statements = Counter()
+        self.timings = Counter()
+        self.depth = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.statements[sql] += 1
+
+    @property
+    def total(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def get_duplicates(self):
+        """
+        SQL, выполненный несколько раз за запрос: признак N+1.
+        """
+        return [
+            (sql, count)
+            for sql, count in self.statements.most_common(
+                settings.SLOW_REQUEST_DUPLICATES,
+            )
+            if count > 1
+        ]
+
+    def get_server_timing(self, total):
+        metrics = [f'db;dur={self.sql:.1f};desc="{self.queries} queries"']
+        metrics.extend(
+            f'{name};dur={duration:.1f}'
+            for name, duration in self.timings.items()
+        )
+        metrics.append(f'total;dur={total:.1f}')
+        return ', '.join(metrics)
+
+
+def get_metrics():
+    return getattr(_local, 'metrics', None)
+
+
+def timed(name):
+    """
+    Добавляет время выполнения функции к показателю name текущего
+    запроса. Вложенные вызовы не учитываются повторно.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            metrics = get_metrics()
+            if metrics is None or metrics.depth[name]:
+                return function(*args, **kwargs)
+            metrics.depth[name] += 1
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.depth[name] -= 1
+                metrics.timings[name] += (
+                    (time.perf_counter() - started) * 1000
+                )
+        return wrapper
+    return decorator
+
+
+def record(endpoint, metrics, total, slow):
+    with _stats_lock:
+        stats = _stats.setdefault(endpoint, Counter())
+        stats['requests'] += 1
+        stats['slow'] += slow
+        stats['total_ms'] += total
+        stats['sql_ms'] += metrics.sql
+        stats['queries'] += metrics.queries
+        stats['max_ms'] = max(stats['max_ms'], total)
+        stats['max_queries'] = max(stats['max_queries'], metrics.queries)
+        for name, duration in metrics.timings.items():
+            stats[f'{name}_ms'] += duration
+
+
+def get_request_stats():
+    """
+    Средние показатели по точкам API в этом процессе.
+    """
+    with _stats_lock:
+        stats = {endpoint: dict(values) for endpoint, values in _stats.items()}
+    result = {}
+    for endpoint, values in sorted(stats.items()):
+        requests = values.pop('requests')
+        result[endpoint] = {
+            'requests': requests,
+            'slow': values.pop('slow'),
+            'max_ms': round(values.pop('max_ms'), 1),
+            'max_queries': values.pop('max_queries'),
+            'queries': round(values.pop('queries') / requests, 1),
+        }
+        for name, value in values.items():
+            result[endpoint][name] = round(value / requests, 1)
+    return result
+
+
+class InstrumentationMiddleware:
+    """
+    Считает SQL-запросы и время этапов обработки запроса, отдаёт их в
+    заголовке Server-Timing и пишет в лог запросы, превысившие
+    SLOW_REQUEST_MS или SLOW_REQUEST_QUERIES, с самыми частыми
+    повторяющимися SQL-запросами.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        _local.metrics = metrics
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = metrics.total
+        response['Server-Timing'] = metrics.get_server_timing(total)
+        endpoint = self.get_endpoint(request)
+        slow = (
+            total > settings.SLOW_REQUEST_MS
+            or metrics.queries > settings.SLOW_REQUEST_QUERIES
+        )
+        if endpoint is not None:
+            record(endpoint, metrics, total, slow)
+        if slow:
+            self.log(request, response, metrics, total)
+        return response
+
+    @staticmethod
+    def get_endpoint(request):
+        match = request.resolver_match
+        if match is None:
+            return None
+        return f'{request.method} {match.route}'
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        """
+        Ответы DRF отрисовываются после представления: время
+        представления и отрисовки считается отдельно.
+        """
+        metrics = get_metrics()
+        started = getattr(request, '_view_started', None)
+        if metrics is None or started is None:
+            return response
+        rendering = time.perf_counter()
+        metrics.timings['view'] += (rendering - started) * 1000
+
+        def rendered(response):
+            metrics.timings['render'] += (
+                (time.perf_counter() - rendering) * 1000
+            )
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def log(request, response, metrics, total):
+        duplicates = ''.join(
+            f'\n  {count} x {sql}' for sql, count in metrics.get_duplicates()
+        )
+        logger.warning(
+            'Медленный запрос %s %s: %s, %.1f мс, SQL-запросов %s '
+            '(%.1f мс)%s',
+            request.method,
+            request.get_full_path(),
+            response.status_code,
+            total,
+            metrics.queries,
+            metrics.sql,
+            duplicates,
+        )
@@ -1,7 +1,161 @@
-from rest_framework.pagination import PageNumberPagination
+import re
+import time
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import QuerySet
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
 from foodgram import settings
 
+CURSOR_MODE = 'cursor'
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+PLAN_ROWS = re.compile(r'rows=(\d+)')
+COST_SMOOTHING = 0.2
 
-class PageLimitPagination(PageNumberPagination):
-    page_size_query_param = 'limit'
+item_costs = {}
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по плану запроса PostgreSQL без COUNT(*).
+    Другие базы оценок не дают, для них считается точное число.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    match = PLAN_ROWS.search(queryset.order_by().explain())
+    if match is None:
+        return queryset.count()
+    return int(match.group(1))
+
+
+class LimitPolicyMixin:
+    """
+    Размер страницы из ?limit= с проверкой и ограничением сверху.
+
+    Предел берётся из max_page_size представления, если он задан. При
+    включённом PAGE_BUDGET_MS страница дополнительно уменьшается так,
+    чтобы сериализация укладывалась в бюджет по средней стоимости
+    одного элемента на этом представлении. Итоговый размер
+    возвращается в поле limit.
+    """
     page_size = settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = settings.MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        page = super().paginate_queryset(queryset, request, view)
+        self.items = len(page) if page is not None else 0
+        self.started = time.perf_counter()
+        return page
+
+    def get_page_size(self, request):
+        limit = request.query_params.get(self.page_size_query_param)
+        size = self.page_size
+        if limit is not None:
+            try:
+                size = int(limit)
+            except ValueError:
+                size = 0
+            if size < 1:
+                raise ValidationError({
+                    self.page_size_query_param:
+                        'Укажите целое положительное число.',
+                })
+        size = min(
+            size, getattr(self.view, 'max_page_size', self.max_page_size)
+        )
+        cost = item_costs.get(self.cost_key)
+        if settings.PAGE_BUDGET_MS and cost:
+            size = max(1, min(size, int(settings.PAGE_BUDGET_MS / cost)))
+        self.limit = size
+        return size
+
+    @property
+    def cost_key(self):
+        if self.view is None:
+            return None
+        return f'{type(self.view).__name__}.{self.view.action}'
+
+    def get_paginated_response(self, data):
+        if self.items and self.cost_key is not None:
+            cost = (time.perf_counter() - self.started) * 1000 / self.items
+            previous = item_costs.get(self.cost_key, cost)
+            item_costs[self.cost_key] = (
+                previous + COST_SMOOTHING * (cost - previous)
+            )
+        response = super().get_paginated_response(data)
+        response.data['limit'] = self.limit
+        return response
+
+
+class KeysetPagination(LimitPolicyMixin, CursorPagination):
+    """
+    Постраничный вывод по курсору на -id: следующая страница выбирается
+    условием id < id последней записи, без OFFSET и COUNT(*).
+
+    Число записей возвращается только по ?count=exact или
+    ?count=estimate.
+    """
+    ordering = '-id'
+    count_query_param = 'count'
+
+    def get_ordering(self, request, queryset, view):
+        return (self.ordering,)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        mode = request.query_params.get(self.count_query_param)
+        self.count = None
+        if mode == COUNT_EXACT:
+            self.count = queryset.count()
+        elif mode == COUNT_ESTIMATE:
+            self.count = estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = OrderedDict(
+                [('count', self.count)] + list(response.data.items())
+            )
+        return response
+
+
+class PageLimitPagination(LimitPolicyMixin, PageNumberPagination):
+    """
+    Постраничный вывод по номеру страницы; по ?pagination=cursor
+    выборки переключаются на KeysetPagination.
+    """
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.is_keyset(request, queryset):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def is_keyset(self, request, queryset):
+        """
+        Курсор применяется только к выборкам в порядке -id: списки и
+        выборки с другой сортировкой (поиск, ?ordering=, популярность)
+        листаются по номеру страницы.
+        """
+        requested = (
+            request.query_params.get(self.mode_query_param) == CURSOR_MODE
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+        return (
+            requested
+            and isinstance(queryset, QuerySet)
+            and tuple(queryset.query.order_by) in ((), ('-id',))
+        )
@@ -0,0 +1,66 @@
+from recipes.models import FavoriteRecipe, ShoppingList
+from users.models import Follow
+
+
+class ViewerRelations:
+    """
+    Связи текущего пользователя с авторами и рецептами.
+
+    Подписки, избранное и список покупок загружаются один раз на запрос
+    в виде множеств идентификаторов и используются всеми сериализаторами
+    ответа.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._followed_ids = None
+        self._favorite_ids = None
+        self._cart_ids = None
+
+    def _load(self, model, field):
+        if self.user is None or self.user.is_anonymous:
+            return frozenset()
+        return frozenset(model.objects.filter(
+            user=self.user,
+        ).values_list(field, flat=True))
+
+    @property
+    def followed_ids(self):
+        if self._followed_ids is None:
+            self._followed_ids = self._load(Follow, 'author_id')
+        return self._followed_ids
+
+    @property
+    def favorite_ids(self):
+        if self._favorite_ids is None:
+            self._favorite_ids = self._load(FavoriteRecipe, 'recipe_id')
+        return self._favorite_ids
+
+    @property
+    def cart_ids(self):
+        if self._cart_ids is None:
+            self._cart_ids = self._load(ShoppingList, 'recipe_id')
+        return self._cart_ids
+
+    def is_subscribed(self, author_id):
+        return author_id in self.followed_ids
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.favorite_ids
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.cart_ids
+
+
+def get_viewer_relations(context):
+    """
+    Возвращает связи пользователя, общие для всего запроса.
+    """
+    request = context.get('request')
+    if request is None:
+        return ViewerRelations(None)
+    relations = getattr(request, '_viewer_relations', None)
+    if relations is None:
+        relations = ViewerRelations(request.user)
+        request._viewer_relations = relations
+    return relations
@@ -23,6 +23,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,6 +66,28 @@ DATABASES = {
     }
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# По умолчанию кеш хранится в памяти процесса. Это годится для одного
+# процесса gunicorn: версии, которые сбрасывают сигналы в других
+# процессах (например, в management-командах), до него не доходят,
+# поэтому ответы живут недолго. Для нескольких процессов задайте общий
+# кеш через CACHE_BACKEND и CACHE_LOCATION (Redis, memcached).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=5000)),
+        },
+    }
+}
+CACHE_IS_SHARED = 'locmem' not in CACHES['default']['BACKEND']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -128,3 +151,51 @@ REST_FRAMEWORK = {
 MIN_AMOUNT_INGREDIENT = 1
 MIN_COOKING_TIME = 1
 PAGE_SIZE = 6
+MAX_PAGE_SIZE = 100
+RECIPES_MAX_PAGE_SIZE = 50
+SUBSCRIPTIONS_MAX_PAGE_SIZE = 20
+PAGE_BUDGET_MS = int(os.getenv('PAGE_BUDGET_MS', default=0)) or None
+
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_INDEX_TTL = 300
+INGREDIENT_SIMILARITY_THRESHOLD = 0.3
+INGREDIENT_SEARCH_BUDGET_MS = 50
+RECIPE_INDEX_TTL = 300
+TAG_IDS_CACHE_TIMEOUT = 300
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
+RECIPE_IMAGE_SIZES = {
+    'thumbnail': 320,
+    'card': 640,
+    'full': 1600,
+}
+RECIPE_IMAGE_FORMATS = ('webp', 'jpeg')
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+RECIPE_IMAGE_MAX_ATTEMPTS = 3
+RECIPE_IMAGE_TASK_TIMEOUT = 600
+
+RESPONSE_CACHE_TIMEOUT = 24 * 60 * 60 if CACHE_IS_SHARED else 5 * 60
+# Добавление в избранное не сбрасывает списки рецептов, поэтому
+# favorites_count и сортировка по нему в закешированных списках
+# отстают не больше чем на это время.
+RECIPE_LIST_CACHE_TIMEOUT = 60
+RESPONSE_CACHE_CONTROL = 'public, no-cache'
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+RESPONSE_CACHE_POLL_INTERVAL = 0.05
+
+TRENDING_HALF_LIFE = 24 * 60 * 60
+TRENDING_WINDOW = 7 * 24 * 60 * 60
+TRENDING_INTERVAL = 5 * 60
+TRENDING_LAG = 5
+TRENDING_MIN_SCORE = 0.001
+
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', default=500))
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', default=30))
+SLOW_REQUEST_DUPLICATES = 5
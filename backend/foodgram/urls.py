@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from foodgram.views import StatsView
+
 api_patterns = [
     path('', include('users.urls')),
     path('', include('recipes.urls')),
+    path('stats/', StatsView.as_view()),
 ]
 
 urlpatterns = [
@@ -0,0 +1,23 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from foodgram.caching import get_cache_stats
+from foodgram.instrumentation import get_request_stats
+from foodgram.paginators import item_costs
+from recipes.permissions import IsAdmin
+
+
+class StatsView(APIView):
+    """
+    Показатели работы API в этом процессе: время и число SQL-запросов
+    по точкам API, попадания в кеш ответов и стоимость элемента
+    страницы.
+    """
+    permission_classes = (IsAdmin,)
+
+    def get(self, request):
+        return Response({
+            'endpoints': get_request_stats(),
+            'cache': get_cache_stats(),
+            'page_costs': dict(item_costs),
+        })
@@ -1,8 +1,12 @@
 from django.contrib import admin
 
 from .models import (
-    FavoriteRecipe, Ingredient, Recipe, RecipeIngredient, ShoppingList, Tag
+    FavoriteRecipe, Ingredient, Recipe, RecipeImageTask, RecipeIngredient,
+    ShoppingCartIngredient, ShoppingList, Tag,
 )
+from .images import enqueue_recipe_image
+from .search import index_recipe_ingredients
+from .shopping_cart import get_recipe_vector, update_recipe_cart_totals
 
 
 @admin.register(Tag)
@@ -63,6 +67,43 @@ class RecipeIngredientsAdmin(admin.ModelAdmin):
     list_display_links = ('recipe',)
     list_filter = ('recipe',)
 
+    @staticmethod
+    def get_vectors(recipe_ids):
+        return {
+            recipe_id: get_recipe_vector(recipe_id) for recipe_id in recipe_ids
+        }
+
+    @staticmethod
+    def update_recipes(old_vectors):
+        """
+        Переносит изменение состава рецептов в суммы списков покупок и
+        обратный индекс: правка строки в админке обходит сериализатор.
+        """
+        for recipe_id, old_vector in old_vectors.items():
+            new_vector = get_recipe_vector(recipe_id)
+            update_recipe_cart_totals(recipe_id, old_vector, new_vector)
+            index_recipe_ingredients(recipe_id, new_vector)
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.add(form.initial['recipe'])
+        old_vectors = self.get_vectors(recipe_ids)
+        super().save_model(request, obj, form, change)
+        self.update_recipes(old_vectors)
+
+    def delete_model(self, request, obj):
+        old_vectors = self.get_vectors({obj.recipe_id})
+        super().delete_model(request, obj)
+        self.update_recipes(old_vectors)
+
+    def delete_queryset(self, request, queryset):
+        old_vectors = self.get_vectors(
+            set(queryset.values_list('recipe_id', flat=True))
+        )
+        super().delete_queryset(request, queryset)
+        self.update_recipes(old_vectors)
+
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
@@ -81,10 +122,23 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientInLine,)
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            enqueue_recipe_image(obj)
+
+    def save_related(self, request, form, formsets, change):
+        old_vector = get_recipe_vector(form.instance) if change else {}
+        super().save_related(request, form, formsets, change)
+        new_vector = get_recipe_vector(form.instance)
+        update_recipe_cart_totals(form.instance, old_vector, new_vector)
+        index_recipe_ingredients(form.instance.id, new_vector)
+
     def count_favorite(self, obj):
-        return FavoriteRecipe.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     count_favorite.short_description = 'В избранном'
+    count_favorite.admin_order_field = 'favorites_count'
 
 
 @admin.register(FavoriteRecipe)
@@ -113,3 +167,25 @@ class ShoppingListAdmin(admin.ModelAdmin):
         'user__email',
         'recipe__name'
     )
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    """
+    Доступ к суммам ингредиентов в списках покупок.
+    """
+    list_display = ('user', 'ingredient', 'amount')
+    search_fields = (
+        'user__username',
+        'user__email',
+        'ingredient__name',
+    )
+
+
+@admin.register(RecipeImageTask)
+class RecipeImageTaskAdmin(admin.ModelAdmin):
+    """
+    Очередь обработки фото рецептов.
+    """
+    list_display = ('recipe', 'created', 'started', 'attempts', 'error')
+    readonly_fields = ('recipe', 'image', 'created', 'started', 'attempts')
@@ -0,0 +1,51 @@
+from django.db import transaction
+
+from foodgram.caching import bump_version, get_versions
+
+TAGS_CACHE = 'tags'
+INGREDIENTS_CACHE = 'ingredients'
+RECIPES_CACHE = 'recipes'
+
+
+def get_recipe_cache(pk):
+    return f'recipe:{pk}'
+
+
+def get_base_keys(request, recipe_ids):
+    """
+    Ключи кеша базовых представлений рецептов. В ключ входит версия
+    рецепта, поэтому после изменения рецепта старое представление
+    больше не находится. Ссылки в представлении абсолютные, поэтому
+    в ключ входят также схема и хост.
+    """
+    versions = get_versions(
+        get_recipe_cache(recipe_id) for recipe_id in recipe_ids
+    )
+    host = (
+        f'{request.scheme}://{request.get_host()}'
+        if request is not None else ''
+    )
+    return {
+        recipe_id: 'recipe-base:{}:{}:{}'.format(
+            recipe_id, versions[get_recipe_cache(recipe_id)], host,
+        )
+        for recipe_id in recipe_ids
+    }
+
+
+def invalidate_recipes(recipe_ids, lists=True):
+    """
+    После фиксации транзакции сбрасывает кеш страниц перечисленных
+    рецептов и, если lists, кеш списков рецептов.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    def bump():
+        if lists:
+            bump_version(RECIPES_CACHE)
+        for recipe_id in recipe_ids:
+            bump_version(get_recipe_cache(recipe_id))
+
+    transaction.on_commit(bump)
@@ -0,0 +1,433 @@
+import csv
+import json
+import os
+import re
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from foodgram.caching import bump_version
+from users.models import User
+from .caching import INGREDIENTS_CACHE, TAGS_CACHE, invalidate_recipes
+from .counters import count_related
+from .filters import TAG_IDS_CACHE_KEY
+from .images import delete_variants
+from .models import (
+    Ingredient, Recipe, RecipeImageTask, RecipeIngredient, ShoppingList, Tag,
+)
+from .search import (
+    ingredient_index, recipe_ingredient_index, update_recipe_search,
+)
+from .shopping_cart import update_recipe_cart_totals
+
+JSON = 'json'
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (JSON, NDJSON, CSV)
+EXTENSIONS = {'.json': JSON, '.ndjson': NDJSON, '.jsonl': NDJSON, '.csv': CSV}
+CHUNK_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,\[]*')
+
+
+def get_format(path, file_format=None):
+    """
+    Формат файла: явно указанный или по расширению.
+    """
+    if file_format:
+        return file_format
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f'Не удалось определить формат файла {path}.')
+    return EXTENSIONS[extension]
+
+
+def read_json_array(file):
+    """
+    Объекты JSON-массива по одному: файл читается кусками, в памяти
+    держится только текущий кусок.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        buffer += chunk
+        position = SEPARATORS.match(buffer).end()
+        while position < len(buffer) and buffer[position] != ']':
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if not chunk:
+                    raise
+                break
+            yield item
+            position = SEPARATORS.match(buffer, position).end()
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        buffer = buffer[position:]
+        if not chunk:
+            return
+
+
+def read_rows(file, file_format):
+    """
+    Строки каталога из файла. Записи фикстур Django ({"model", "pk",
+    "fields"}) разворачиваются в поля.
+    """
+    if file_format == CSV:
+        rows = csv.DictReader(file)
+    elif file_format == NDJSON:
+        rows = (json.loads(line) for line in file if line.strip())
+    else:
+        rows = read_json_array(file)
+    for row in rows:
+        yield row['fields'] if 'fields' in row else row
+
+
+def write_rows(file, file_format, fields, rows):
+    """
+    Записывает строки по мере получения; возвращает их число. В CSV
+    списки записываются строкой JSON.
+    """
+    written = 0
+    if file_format == CSV:
+        writer = csv.DictWriter(file, fields)
+        writer.writeheader()
+    elif file_format == JSON:
+        file.write('[')
+    for row in rows:
+        if file_format == CSV:
+            writer.writerow({
+                name: json.dumps(value, ensure_ascii=False)
+                if isinstance(value, list) else value
+                for name, value in row.items()
+            })
+        elif file_format == NDJSON:
+            file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        else:
+            separator = ',\n' if written else '\n'
+            file.write(separator + json.dumps(row, ensure_ascii=False))
+        written += 1
+    if file_format == JSON:
+        file.write('\n]\n')
+    return written
+
+
+def parse_list(value):
+    if isinstance(value, str):
+        return json.loads(value) if value else []
+    return value
+
+
+def upsert(model, key, fields, objects):
+    """
+    Добавляет отсутствующие объекты и обновляет изменившиеся, сравнивая
+    их по полям key. Возвращает добавленные, обновлённые и найденные в
+    базе объекты.
+    """
+    objects = {
+        tuple(getattr(obj, name) for name in key): obj for obj in objects
+    }
+    existing = {}
+    lookup = model.objects.filter(**{
+        f'{key[0]}__in': {values[0] for values in objects}
+    })
+    for obj in lookup:
+        values = tuple(getattr(obj, name) for name in key)
+        if values in objects:
+            existing[values] = obj
+    created = [
+        obj for values, obj in objects.items() if values not in existing
+    ]
+    model.objects.bulk_create(created, ignore_conflicts=True)
+    changed_fields = [name for name in fields if name not in key]
+    # Связи сравниваются по id, без загрузки связанных объектов.
+    attnames = [
+        model._meta.get_field(name).attname for name in changed_fields
+    ]
+    updated = []
+    for values, obj in objects.items():
+        current = existing.get(values)
+        if current is None or all(
+            getattr(current, name) == getattr(obj, name) for name in attnames
+        ):
+            continue
+        obj.pk = current.pk
+        updated.append(obj)
+    if updated:
+        model.objects.bulk_update(updated, changed_fields)
+    return created, updated, existing
+
+
+class Catalog:
+    """
+    Выгрузка и загрузка одной таблицы каталога.
+
+    Выгрузка идёт пачками по возрастанию id, загрузка - пачками с
+    добавлением и обновлением по естественному ключу. finish()
+    вызывается после загрузки всех пачек и сбрасывает кеши и индексы.
+    """
+    model = None
+    key = ()
+    fields = ()
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def to_row(self, obj):
+        return {name: getattr(obj, name) for name in self.fields}
+
+    def from_row(self, row):
+        return self.model(**{name: row[name] for name in self.fields})
+
+    def export(self, batch_size):
+        last_id = 0
+        while True:
+            batch = list(self.get_queryset().filter(
+                pk__gt=last_id,
+            ).order_by('pk')[:batch_size])
+            if not batch:
+                return
+            for obj in batch:
+                yield self.to_row(obj)
+            last_id = batch[-1].pk
+
+    @transaction.atomic
+    def import_batch(self, rows):
+        """
+        Загружает пачку; возвращает число добавленных, обновлённых и
+        пропущенных строк.
+        """
+        created, updated, _ = upsert(
+            self.model, self.key, self.fields,
+            [self.from_row(row) for row in rows],
+        )
+        self.after_import(updated)
+        return len(created), len(updated), 0
+
+    def after_import(self, updated):
+        pass
+
+    def finish(self):
+        pass
+
+
+class IngredientCatalog(Catalog):
+    model = Ingredient
+    key = ('name', 'measurement_unit')
+    fields = ('name', 'measurement_unit')
+
+    def finish(self):
+        ingredient_index.invalidate()
+        bump_version(INGREDIENTS_CACHE)
+
+
+class TagCatalog(Catalog):
+    model = Tag
+    key = ('name',)
+    fields = ('name', 'color', 'slug')
+
+    def after_import(self, updated):
+        invalidate_recipes(Recipe.objects.filter(
+            tags__in=updated,
+        ).values_list('id', flat=True).distinct())
+
+    def finish(self):
+        cache.delete(TAG_IDS_CACHE_KEY)
+        bump_version(TAGS_CACHE)
+
+
+class RecipeCatalog(Catalog):
+    """
+    Рецепты с автором (username), тегами (slug) и ингредиентами
+    (название, единица измерения, количество). Фото указывается путём
+    в хранилище и ставится в очередь на обработку.
+    """
+    model = Recipe
+    key = ('name',)
+    fields = (
+        'name', 'author', 'text', 'cooking_time', 'image', 'tags',
+        'ingredients',
+    )
+    model_fields = ('name', 'author', 'text', 'cooking_time', 'image')
+
+    def get_queryset(self):
+        return Recipe.objects.with_related(
+            {'author', 'tags', 'ingredients', 'text'},
+        )
+
+    def to_row(self, recipe):
+        return {
+            'name': recipe.name,
+            'author': recipe.author.username,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'image': recipe.image.name,
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.recipe_ingredient.all()
+            ],
+        }
+
+    @staticmethod
+    def resolve(rows):
+        """
+        Авторы, теги и ингредиенты пачки: по одному запросу на таблицу.
+        """
+        authors = User.objects.in_bulk(
+            {row['author'] for row in rows}, field_name='username',
+        )
+        tags = Tag.objects.in_bulk(
+            {slug for row in rows for slug in row['tags']},
+            field_name='slug',
+        )
+        names = {item['name'] for row in rows for item in row['ingredients']}
+        ingredients = {
+            (name, unit): ingredient_id
+            for ingredient_id, name, unit in Ingredient.objects.filter(
+                name__in=names,
+            ).values_list('id', 'name', 'measurement_unit')
+        }
+        return authors, tags, ingredients
+
+    def parse(self, rows):
+        """
+        Рецепты пачки с векторами ингредиентов и id тегов. Строки с
+        неизвестным автором, тегом или ингредиентом пропускаются.
+        """
+        for row in rows:
+            row['tags'] = parse_list(row['tags'])
+            row['ingredients'] = parse_list(row['ingredients'])
+        authors, tags, ingredients = self.resolve(rows)
+        parsed = {}
+        for row in rows:
+            vector = {
+                ingredients.get((item['name'], item['measurement_unit'])):
+                    int(item['amount'])
+                for item in row['ingredients']
+            }
+            tag_ids = {tags[slug].id for slug in row['tags'] if slug in tags}
+            if (
+                row['author'] not in authors or None in vector
+                or len(tag_ids) < len(set(row['tags']))
+            ):
+                continue
+            recipe = Recipe(
+                name=row['name'],
+                author=authors[row['author']],
+                text=row['text'],
+                cooking_time=int(row['cooking_time']),
+                image=row['image'],
+            )
+            parsed[recipe.name] = recipe, vector, tag_ids
+        return parsed
+
+    @transaction.atomic
+    def import_batch(self, rows):
+        parsed = self.parse(rows)
+        created, updated, existing = upsert(
+            Recipe, self.key, self.model_fields,
+            [recipe for recipe, _, _ in parsed.values()],
+        )
+        ids = dict(Recipe.objects.filter(
+            name__in=parsed,
+        ).values_list('name', 'id'))
+        changed = self.update_relations({
+            ids[name]: (vector, tag_ids)
+            for name, (_, vector, tag_ids) in parsed.items() if name in ids
+        })
+        touched = {ids[recipe.name] for recipe in created + updated}
+        update_recipe_search(touched)
+        invalidate_recipes(touched | changed)
+        previous = {recipe.name: recipe for recipe in existing.values()}
+        self.update_images([
+            ids[recipe.name] for recipe in created + updated
+            if recipe.name not in previous
+            or previous[recipe.name].image != recipe.image
+        ])
+        User.objects.filter(id__in={
+            recipe.author_id for recipe, _, _ in parsed.values()
+        } | {
+            recipe.author_id for recipe in previous.values()
+        }).update(recipes_count=count_related(Recipe, 'author'))
+        return len(created), len(updated), len(rows) - len(parsed)
+
+    @staticmethod
+    def update_relations(relations):
+        """
+        Заменяет ингредиенты и теги рецептов, у которых они отличаются,
+        и переносит изменения состава в списки покупок. Возвращает id
+        изменённых рецептов.
+        """
+        vectors = defaultdict(dict)
+        tag_sets = defaultdict(set)
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=relations,
+        ).values_list('recipe_id', 'ingredient_id', 'amount')
+        for recipe_id, ingredient_id, amount in rows:
+            vectors[recipe_id][ingredient_id] = amount
+        for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe_id__in=relations,
+        ).values_list('recipe_id', 'tag_id'):
+            tag_sets[recipe_id].add(tag_id)
+        ingredients_changed = [
+            recipe_id for recipe_id, (vector, _) in relations.items()
+            if vectors[recipe_id] != vector
+        ]
+        tags_changed = [
+            recipe_id for recipe_id, (_, tag_ids) in relations.items()
+            if tag_sets[recipe_id] != tag_ids
+        ]
+        RecipeIngredient.objects.filter(
+            recipe_id__in=ingredients_changed,
+        ).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for recipe_id in ingredients_changed
+            for ingredient_id, amount in relations[recipe_id][0].items()
+        )
+        Recipe.tags.through.objects.filter(
+            recipe_id__in=tags_changed,
+        ).delete()
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in tags_changed
+            for tag_id in relations[recipe_id][1]
+        )
+        for recipe_id in set(ShoppingList.objects.filter(
+            recipe_id__in=ingredients_changed,
+        ).values_list('recipe_id', flat=True)):
+            update_recipe_cart_totals(
+                recipe_id, vectors[recipe_id], relations[recipe_id][0],
+            )
+        return set(ingredients_changed) | set(tags_changed)
+
+    @staticmethod
+    def update_images(recipe_ids):
+        delete_variants(recipe_ids)
+        RecipeImageTask.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeImageTask.objects.bulk_create(
+            RecipeImageTask(recipe_id=recipe_id, image=image)
+            for recipe_id, image in Recipe.objects.filter(
+                id__in=recipe_ids,
+            ).exclude(image='').values_list('id', 'image')
+        )
+
+    def finish(self):
+        recipe_ingredient_index.invalidate()
+
+
+CATALOGS = {
+    'ingredients': IngredientCatalog,
+    'tags': TagCatalog,
+    'recipes': RecipeCatalog,
+}
@@ -0,0 +1,36 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Follow, User
+from .models import FavoriteRecipe, Recipe
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def count_related(model, field):
+    """
+    Подзапрос: число строк model, ссылающихся через field на объект
+    внешнего запроса.
+    """
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk'),
+        ).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарно меняет счётчик на delta, не опуская его ниже нуля.
+    """
+    objects = model.objects.filter(pk=pk)
+    if delta < 0:
+        objects = objects.filter(**{f'{field}__gte': -delta})
+    objects.update(**{field: F(field) + delta})
@@ -1,6 +1,51 @@
+from django import forms
+from django.core.cache import cache
+from django.db.models import Count, Exists, OuterRef
 from django_filters import rest_framework as filters
+from rest_framework.filters import OrderingFilter
 
-from .models import Ingredient, Recipe
+from foodgram import settings
+from .models import FavoriteRecipe, Ingredient, Recipe, ShoppingList, Tag
+from .search import search_recipes
+
+TAG_IDS_CACHE_KEY = 'recipes:tag_ids_by_slug'
+TAGS_MODE_ANY = 'any'
+TAGS_MODE_ALL = 'all'
+TAGS_MODES = (
+    (TAGS_MODE_ANY, TAGS_MODE_ANY),
+    (TAGS_MODE_ALL, TAGS_MODE_ALL),
+)
+
+
+def get_tag_ids_by_slug(slugs):
+    """
+    Соответствие слагов тегов их id. Кешируется на
+    TAG_IDS_CACHE_TIMEOUT и сбрасывается при изменении тегов; если
+    слага нет в кеше, соответствие перечитывается из базы, чтобы тег
+    из другого процесса не терялся до истечения кеша.
+    """
+    tag_ids_by_slug = cache.get(TAG_IDS_CACHE_KEY)
+    if tag_ids_by_slug is None or not set(slugs) <= tag_ids_by_slug.keys():
+        tag_ids_by_slug = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(
+            TAG_IDS_CACHE_KEY,
+            tag_ids_by_slug,
+            settings.TAG_IDS_CACHE_TIMEOUT,
+        )
+    return tag_ids_by_slug
+
+
+class SlugMultipleField(forms.MultipleChoiceField):
+    """
+    Список слагов без проверки по заранее заданным вариантам.
+    """
+
+    def valid_value(self, value):
+        return True
+
+
+class SlugMultipleFilter(filters.MultipleChoiceFilter):
+    field_class = SlugMultipleField
 
 
 class IngredientFilter(filters.FilterSet):
@@ -29,14 +74,72 @@ class RecipeFilter(filters.FilterSet):
         field_name='is_in_shopping_cart',
         method='shopping_cart_filter'
     )
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = SlugMultipleFilter(method='tags_filter')
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODES,
+        method='tags_mode_filter',
+    )
+    search = filters.CharFilter(method='search_filter')
 
     def favorite_filter(self, queryset, name, value):
-        return Recipe.objects.filter(favorite_recipe__user=self.request.user)
+        return self.user_relation_filter(queryset, name, value, FavoriteRecipe)
 
     def shopping_cart_filter(self, queryset, name, value):
-        return Recipe.objects.filter(shopping_recipe__user=self.request.user)
+        return self.user_relation_filter(queryset, name, value, ShoppingList)
+
+    def user_relation_filter(self, queryset, name, value, model):
+        """
+        Рецепты, которые есть (или которых нет) в избранном или списке
+        покупок пользователя. Отбор добавляется к остальным фильтрам
+        через EXISTS.
+        """
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none() if value else queryset
+        return queryset.annotate(**{name: Exists(model.objects.filter(
+            recipe=OuterRef('pk'),
+            user=user,
+        ))}).filter(**{name: value})
+
+    def tags_filter(self, queryset, name, value):
+        """
+        Рецепты с любым из тегов или, при tags_mode=all, со всеми
+        тегами сразу. Связи проверяются подзапросом по индексу таблицы
+        рецепт-тег, без JOIN и DISTINCT во внешнем запросе.
+        """
+        tag_ids_by_slug = get_tag_ids_by_slug(value)
+        tag_ids = {
+            tag_ids_by_slug[slug] for slug in value if slug in tag_ids_by_slug
+        }
+        match_all = self.form.cleaned_data.get('tags_mode') == TAGS_MODE_ALL
+        if not tag_ids or match_all and len(tag_ids) < len(set(value)):
+            return queryset.none()
+        recipe_tags = Recipe.tags.through.objects.filter(tag_id__in=tag_ids)
+        if match_all:
+            recipe_tags = recipe_tags.values('recipe_id').annotate(
+                tags_count=Count('tag_id'),
+            ).filter(tags_count=len(tag_ids))
+        return queryset.filter(id__in=recipe_tags.values('recipe_id'))
+
+    def tags_mode_filter(self, queryset, name, value):
+        return queryset
+
+    def search_filter(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
     class Meta:
         model = Recipe
         fields = ['author']
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    Сортировка по ?ordering=, например -favorites_count для популярных
+    рецептов; при равных значениях первыми идут новые рецепты.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not {'id', '-id'} & set(ordering):
+            return list(ordering) + ['-id']
+        return ordering
@@ -0,0 +1,208 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from foodgram import settings
+from .caching import invalidate_recipes
+from .models import Recipe, RecipeImageTask, RecipeImageVariant
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+SAVE_OPTIONS = {
+    'webp': {'method': 4},
+    'jpeg': {'optimize': True, 'progressive': True},
+}
+
+# Потоки пула запускаются только при первой задаче. Pillow отпускает
+# GIL при декодировании, масштабировании и кодировании.
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS or 1,
+    thread_name_prefix='recipe-images',
+)
+
+
+def decode(file):
+    """
+    Декодирует фото один раз, сразу в уменьшенном масштабе, если формат
+    это позволяет, с учётом ориентации из EXIF и на белом фоне.
+    """
+    largest = max(settings.RECIPE_IMAGE_SIZES.values())
+    with Image.open(file) as image:
+        if image.width * image.height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            raise ValueError('Слишком большое изображение.')
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+    if image.mode == 'RGB':
+        return image
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def render_variants(file):
+    """
+    Варианты фото: каждый размер уменьшается из предыдущего, большего,
+    и кодируется во все форматы.
+    """
+    image = decode(file)
+    sizes = sorted(
+        settings.RECIPE_IMAGE_SIZES.items(), key=lambda item: -item[1]
+    )
+    for size, side in sizes:
+        image.thumbnail((side, side), Image.LANCZOS)
+        for image_format in settings.RECIPE_IMAGE_FORMATS:
+            buffer = BytesIO()
+            image.save(
+                buffer,
+                image_format.upper(),
+                quality=settings.RECIPE_IMAGE_QUALITY,
+                **SAVE_OPTIONS.get(image_format, {}),
+            )
+            yield size, image_format, image.size, buffer.getvalue()
+
+
+def delete_variants(recipe_ids):
+    """
+    Удаляет варианты фото рецептов; файлы удаляются после фиксации
+    транзакции.
+    """
+    variants = RecipeImageVariant.objects.filter(recipe_id__in=recipe_ids)
+    names = list(variants.values_list('image', flat=True))
+    if not names:
+        return
+    variants.delete()
+    storage = RecipeImageVariant._meta.get_field('image').storage
+    transaction.on_commit(lambda: [storage.delete(name) for name in names])
+
+
+def build_variants(task):
+    recipe = task.recipe
+    with recipe.image.open('rb') as file:
+        rendered = list(render_variants(file))
+    variants = []
+    for size, image_format, (width, height), content in rendered:
+        variant = RecipeImageVariant(
+            recipe=recipe,
+            size=size,
+            format=image_format,
+            width=width,
+            height=height,
+        )
+        variant.image.save(
+            f'{recipe.id}_{size}.{EXTENSIONS[image_format]}',
+            ContentFile(content),
+            save=False,
+        )
+        variants.append(variant)
+    with transaction.atomic():
+        current = Recipe.objects.select_for_update().filter(
+            id=recipe.id, image=task.image,
+        )
+        if not current.exists():
+            for variant in variants:
+                variant.image.delete(save=False)
+            return
+        delete_variants([recipe.id])
+        RecipeImageVariant.objects.bulk_create(variants)
+        invalidate_recipes([recipe.id])
+
+
+def run_task(task_id):
+    """
+    Выполняет задачу, если её ещё не взял другой поток или процесс.
+    При ошибке задача возвращается в очередь до исчерпания попыток.
+    """
+    claimed = RecipeImageTask.objects.filter(
+        id=task_id, started__isnull=True,
+    ).update(started=timezone.now(), attempts=F('attempts') + 1)
+    if not claimed:
+        return False
+    task = RecipeImageTask.objects.select_related('recipe').filter(
+        id=task_id,
+    ).first()
+    if task is None:
+        return False
+    try:
+        build_variants(task)
+    except Exception as error:
+        logger.exception('Не удалось обработать фото рецепта %s', task.recipe)
+        RecipeImageTask.objects.filter(id=task_id).update(
+            started=None, error=str(error),
+        )
+        return False
+    task.delete()
+    return True
+
+
+def _run_in_thread(task_id):
+    try:
+        run_task(task_id)
+    finally:
+        connection.close()
+
+
+def enqueue_recipe_image(recipe):
+    """
+    Ставит фото рецепта в очередь на обработку. Пока варианты не
+    построены, вместо них отдаётся исходное фото.
+    """
+    delete_variants([recipe.id])
+    RecipeImageTask.objects.filter(
+        recipe=recipe, started__isnull=True,
+    ).delete()
+    task = RecipeImageTask.objects.create(
+        recipe=recipe, image=recipe.image.name,
+    )
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: executor.submit(_run_in_thread, task.id)
+        )
+    else:
+        transaction.on_commit(lambda: run_task(task.id))
+
+
+def get_pending_tasks():
+    """
+    Задачи, которые ещё не выполнены: не взятые в работу и зависшие
+    дольше RECIPE_IMAGE_TASK_TIMEOUT секунд.
+    """
+    stale = timezone.now() - timedelta(
+        seconds=settings.RECIPE_IMAGE_TASK_TIMEOUT
+    )
+    return RecipeImageTask.objects.filter(
+        Q(started__isnull=True) | Q(started__lt=stale),
+        attempts__lt=settings.RECIPE_IMAGE_MAX_ATTEMPTS,
+    )
+
+
+def get_variant_urls(recipe, request=None):
+    """
+    Ссылки на варианты фото по размерам и форматам; ещё не построенные
+    варианты заменяются ссылкой на исходное фото.
+    """
+    def build_url(url):
+        if request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+    original = build_url(recipe.image.url) if recipe.image else None
+    ready = {
+        (variant.size, variant.format): build_url(variant.image.url)
+        for variant in recipe.image_variants.all()
+    }
+    return {
+        size: {
+            image_format: ready.get((size, image_format), original)
+            for image_format in settings.RECIPE_IMAGE_FORMATS
+        }
+        for size in settings.RECIPE_IMAGE_SIZES
+    }
@@ -0,0 +1,238 @@
+import json
+import math
+import random
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from foodgram import settings
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+from .seed_benchmark import PREFIX
+
+REPEAT = 50
+WARMUP = 3
+THRESHOLD = 20
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """
+    Перцентиль по методу ближайшего ранга; values отсортированы.
+    """
+    index = math.ceil(rank / 100 * len(values)) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет запросы к основным точкам API через тестовый клиент '
+        'и сохраняет задержки, число запросов к базе и размер ответов '
+        'в JSON для сравнения между запусками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=REPEAT,
+            help='Количество замеряемых запросов на сценарий.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=WARMUP,
+            help='Количество незамеряемых запросов перед замером.',
+        )
+        parser.add_argument(
+            '--scenarios',
+            help='Сценарии через запятую; по умолчанию все.',
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кеш перед каждым запросом.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для результатов.')
+        parser.add_argument(
+            '--compare',
+            help='Файл прошлого запуска для поиска регрессий.',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=THRESHOLD,
+            help='Допустимый рост p95 и размера ответа, %%.',
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(
+            username__startswith=f'{PREFIX}_',
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError('Нет данных; выполните seed_benchmark.')
+        scenarios = self.get_scenarios(user, random.Random(options['seed']))
+        if options['scenarios']:
+            names = options['scenarios'].split(',')
+            unknown = set(names) - scenarios.keys()
+            if unknown:
+                raise CommandError(f'Неизвестные сценарии: {unknown}.')
+            scenarios = {name: scenarios[name] for name in names}
+        # Тысячи запросов от одного клиента упёрлись бы в ограничения
+        # частоты запросов.
+        with mock.patch.object(APIView, 'get_throttles', lambda view: []):
+            results = {
+                name: self.measure(client, get_url, options)
+                for name, (client, get_url) in scenarios.items()
+            }
+        report = {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'cold': options['cold'],
+            'repeat': options['repeat'],
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'ingredients': Ingredient.objects.count(),
+            'results': results,
+        }
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name}: p50 {result["p50"]} мс, p95 {result["p95"]} мс, '
+                f'p99 {result["p99"]} мс, запросов {result["queries"]}, '
+                f'{result["bytes"]} байт'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(options['compare'], results, options['threshold'])
+
+    @staticmethod
+    def get_scenarios(user, rng):
+        """
+        Сценарий: клиент и функция, возвращающая адрес очередного
+        запроса.
+        """
+        anonymous = APIClient()
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        last_page = max(len(recipe_ids) // settings.PAGE_SIZE, 1)
+        return {
+            'recipes_anonymous': (anonymous, lambda: '/api/recipes/'),
+            'recipes': (client, lambda: '/api/recipes/'),
+            'recipes_deep_page': (
+                client, lambda: f'/api/recipes/?page={last_page}',
+            ),
+            'recipes_cursor': (
+                client, lambda: '/api/recipes/?pagination=cursor',
+            ),
+            'recipes_tags': (
+                client, lambda: '/api/recipes/?tags={}'.format(
+                    rng.choice(tag_slugs)
+                ),
+            ),
+            'recipes_tags_all': (
+                client,
+                lambda: '/api/recipes/?tags_mode=all&' + '&'.join(
+                    f'tags={slug}' for slug in rng.sample(tag_slugs, 2)
+                ),
+            ),
+            'recipes_favorited': (
+                client, lambda: '/api/recipes/?is_favorited=1',
+            ),
+            'recipe_detail': (
+                client,
+                lambda: f'/api/recipes/{rng.choice(recipe_ids)}/',
+            ),
+            'subscriptions': (
+                client, lambda: '/api/users/subscriptions/?recipes_limit=3',
+            ),
+            'ingredients_search': (
+                anonymous,
+                lambda: '/api/ingredients/?name={}'.format(
+                    rng.choice(names)[:rng.randint(1, 4)]
+                ),
+            ),
+            'download_shopping_cart': (
+                client, lambda: '/api/recipes/download_shopping_cart/',
+            ),
+        }
+
+    @staticmethod
+    def measure(client, get_url, options):
+        timings = []
+        queries = []
+        sizes = []
+        for iteration in range(options['warmup'] + options['repeat']):
+            url = get_url()
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url)
+                content = (
+                    b''.join(response.streaming_content)
+                    if response.streaming else response.content
+                )
+                elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                raise CommandError(f'{url}: ответ {response.status_code}.')
+            if iteration < options['warmup']:
+                continue
+            timings.append(elapsed)
+            queries.append(len(context.captured_queries))
+            sizes.append(len(content))
+        timings.sort()
+        result = {
+            f'p{rank}': round(percentile(timings, rank), 3)
+            for rank in PERCENTILES
+        }
+        result['mean'] = round(sum(timings) / len(timings), 3)
+        result['queries'] = max(queries)
+        result['bytes'] = round(sum(sizes) / len(sizes))
+        return result
+
+    def compare(self, path, results, threshold):
+        """
+        Регрессия: p95 или размер ответа выросли больше чем на
+        threshold процентов или стало больше запросов к базе.
+        """
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        limit = 1 + threshold / 100
+        regressions = []
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            for metric in ('p95', 'bytes'):
+                if result[metric] > previous[metric] * limit:
+                    regressions.append(
+                        f'{name}.{metric}: {previous[metric]} -> '
+                        f'{result[metric]}'
+                    )
+            if result['queries'] > previous['queries']:
+                regressions.append(
+                    f'{name}.queries: {previous["queries"]} -> '
+                    f'{result["queries"]}'
+                )
+        if regressions:
+            raise CommandError(
+                'Регрессии:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
@@ -0,0 +1,68 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodgram import settings
+from recipes.filters import IngredientFilter
+from recipes.models import Ingredient
+from recipes.search import ingredient_index
+
+QUERIES = 200
+PREFIX_LENGTHS = (1, 2, 3, 5)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость поиска ингредиентов по индексу в памяти '
+        'и через IngredientFilter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=QUERIES,
+            help='Количество поисковых запросов.',
+        )
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            self.stdout.write(self.style.ERROR('Нет ингредиентов.'))
+            return
+        queries = [
+            random.choice(names)[:random.choice(PREFIX_LENGTHS)]
+            for _ in range(options['queries'])
+        ]
+        started = time.perf_counter()
+        ingredient_index.build()
+        self.stdout.write(
+            f'Построение индекса: {self.ms(started):.1f} мс, '
+            f'ингредиентов: {len(names)}'
+        )
+        self.report('Индекс', queries, lambda query: (
+            ingredient_index.search(query, settings.INGREDIENT_SEARCH_LIMIT)
+        ))
+        self.report('IngredientFilter', queries, lambda query: list(
+            IngredientFilter(
+                {'name': query}, queryset=Ingredient.objects.all(),
+            ).qs.values('id', 'name', 'measurement_unit')
+        ))
+
+    def report(self, title, queries, search):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            timings.append(self.ms(started))
+        timings.sort()
+        self.stdout.write(
+            f'{title}: среднее {sum(timings) / len(timings):.3f} мс, '
+            f'p50 {timings[len(timings) // 2]:.3f} мс, '
+            f'p95 {timings[int(len(timings) * 0.95)]:.3f} мс'
+        )
+
+    @staticmethod
+    def ms(started):
+        return (time.perf_counter() - started) * 1000
@@ -0,0 +1,87 @@
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from foodgram import settings
+from foodgram.paginators import KeysetPagination, PageLimitPagination
+from recipes.models import Recipe
+
+PAGES = '1,10,100,1000'
+REPEAT = 20
+URL = '/api/recipes/'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время выборки страницы рецептов по номеру страницы '
+        'и по курсору на разной глубине ленты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            default=PAGES,
+            help='Номера страниц через запятую.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=settings.PAGE_SIZE,
+            help='Размер страницы.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=REPEAT,
+            help='Количество повторов для каждой страницы.',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Recipe.objects.only('id')
+        limit = options['limit']
+        total = queryset.count()
+        self.stdout.write(f'Рецептов: {total}, размер страницы: {limit}')
+        for page in map(int, options['pages'].split(',')):
+            if (page - 1) * limit >= total:
+                raise CommandError(f'Страницы {page} нет.')
+            by_number = {'page': page, 'limit': limit}
+            by_cursor = {'limit': limit, 'pagination': 'cursor'}
+            if page > 1:
+                by_cursor['cursor'] = self.get_cursor(
+                    queryset, (page - 1) * limit
+                )
+            self.stdout.write(
+                f'Страница {page}: '
+                f'по номеру {self.measure(queryset, by_number, options)}, '
+                f'по курсору {self.measure(queryset, by_cursor, options)}'
+            )
+
+    @staticmethod
+    def get_cursor(queryset, offset):
+        """
+        Курсор страницы, которая начинается после offset записей.
+        """
+        position = queryset.values_list('id', flat=True)[offset - 1]
+        paginator = KeysetPagination()
+        paginator.base_url = URL
+        url = paginator.encode_cursor(Cursor(
+            offset=0, reverse=False, position=str(position),
+        ))
+        return parse_qs(urlparse(url).query)['cursor'][0]
+
+    def measure(self, queryset, params, options):
+        request = Request(APIRequestFactory().get(URL, params))
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            PageLimitPagination().paginate_queryset(queryset, request)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return (
+            f'p50 {timings[len(timings) // 2]:.2f} мс, '
+            f'p95 {timings[int(len(timings) * 0.95)]:.2f} мс'
+        )
@@ -0,0 +1,54 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.catalog import CATALOGS, FORMATS, get_format, write_rows
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает ингредиенты, теги или рецепты в JSON, NDJSON или CSV, '
+        'читая таблицу пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalog', choices=sorted(CATALOGS))
+        parser.add_argument('path', help='Файл или - для stdout.')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество записей в одной пачке.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            file_format = get_format(path, options['format'])
+        except ValueError as error:
+            raise CommandError(error)
+        catalog = CATALOGS[options['catalog']]()
+        started = time.perf_counter()
+        if path == '-':
+            written = write_rows(
+                sys.stdout, file_format, catalog.fields,
+                catalog.export(options['batch_size']),
+            )
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            written = write_rows(
+                file, file_format, catalog.fields,
+                catalog.export(options['batch_size']),
+            )
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено строк: {written}, {round(written / elapsed)} строк/с.'
+        ))
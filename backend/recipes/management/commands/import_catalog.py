@@ -0,0 +1,78 @@
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.catalog import CATALOGS, FORMATS, get_format, read_rows
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты, теги или рецепты из JSON, NDJSON или CSV '
+        'пачками, добавляя новые записи и обновляя изменившиеся.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalog', choices=sorted(CATALOGS))
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество строк в одной пачке.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            file_format = get_format(path, options['format'])
+        except ValueError as error:
+            raise CommandError(error)
+        if path == '-':
+            self.load(sys.stdin, file_format, options)
+            return
+        with open(path, encoding='utf-8', newline='') as file:
+            self.load(file, file_format, options)
+
+    def load(self, file, file_format, options):
+        catalog = CATALOGS[options['catalog']]()
+        rows = read_rows(file, file_format)
+        started = time.perf_counter()
+        processed = created = updated = skipped = 0
+        while True:
+            try:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                counts = catalog.import_batch(batch)
+            except (KeyError, TypeError, ValueError) as error:
+                raise CommandError(
+                    f'Ошибка в данных после строки {processed}: {error!r}'
+                )
+            processed += len(batch)
+            created += counts[0]
+            updated += counts[1]
+            skipped += counts[2]
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'Обработано строк: {processed}, '
+                    f'{self.rate(processed, started)} строк/с'
+                )
+        catalog.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {processed}, добавлено: {created}, '
+            f'обновлено: {updated}, пропущено: {skipped}, '
+            f'{self.rate(processed, started)} строк/с.'
+        ))
+
+    @staticmethod
+    def rate(rows, started):
+        return round(rows / max(time.perf_counter() - started, 1e-9))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import get_pending_tasks, run_task
+from recipes.models import Recipe, RecipeImageTask
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит варианты фото рецептов по задачам из очереди: '
+        'оставшимся после перезапуска, зависшим и упавшим с ошибкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Поставить в очередь рецепты, у которых нет вариантов фото.',
+        )
+
+    def handle(self, *args, **options):
+        if options['missing']:
+            recipes = Recipe.objects.exclude(image='').filter(
+                image_variants__isnull=True,
+                image_tasks__isnull=True,
+            ).values_list('id', 'image').distinct()
+            RecipeImageTask.objects.bulk_create(
+                RecipeImageTask(recipe_id=recipe_id, image=image)
+                for recipe_id, image in recipes.iterator()
+            )
+        tasks = get_pending_tasks()
+        tasks.filter(started__isnull=False).update(started=None)
+        task_ids = list(tasks.values_list('id', flat=True))
+        done = sum(run_task(task_id) for task_id in task_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано фото: {done} из {len(task_ids)}.'
+        ))
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingCartIngredient, ShoppingList
+from recipes.shopping_cart import get_live_cart_totals
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет суммы ингредиентов в списках покупок с рецептами '
+        'и пересобирает расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить, ничего не изменяя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество пользователей в одной пачке.',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = sorted(set(
+            ShoppingList.objects.values_list('user_id', flat=True)
+        ) | set(
+            ShoppingCartIngredient.objects.values_list('user_id', flat=True)
+        ))
+        batch_size = options['batch_size']
+        mismatched = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            broken = self.compare(batch)
+            mismatched += len(broken)
+            if broken and not options['check']:
+                self.rebuild(broken)
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS(
+                f'Проверено пользователей: {len(user_ids)}, расхождений нет.'
+            ))
+        elif options['check']:
+            self.stdout.write(self.style.ERROR(
+                f'Расхождения у пользователей: {mismatched}.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересобрано списков покупок: {mismatched}.'
+            ))
+
+    @staticmethod
+    def compare(user_ids):
+        live = {
+            (row['recipe__shopping_recipe__user'], row['ingredient']):
+                row['total']
+            for row in get_live_cart_totals(user_ids)
+        }
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in
+            ShoppingCartIngredient.objects.filter(
+                user_id__in=user_ids,
+            ).values_list('user_id', 'ingredient_id', 'amount')
+        }
+        return {key[0] for key, _ in live.items() ^ stored.items()}
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(user_ids):
+        ShoppingCartIngredient.objects.filter(user_id__in=user_ids).delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(
+                user_id=row['recipe__shopping_recipe__user'],
+                ingredient_id=row['ingredient'],
+                amount=row['total'],
+            )
+            for row in get_live_cart_totals(user_ids)
+        )
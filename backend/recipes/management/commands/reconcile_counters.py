@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Max
+
+from recipes.counters import COUNTERS, count_related
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики избранного, рецептов и подписчиков с данными '
+        'и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить, ничего не изменяя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество записей в одной пачке.',
+        )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            mismatched = self.reconcile(
+                model, field, count_related(related_model, related_field),
+                options,
+            )
+            title = f'{model._meta.verbose_name_plural}.{field}'
+            if not mismatched:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{title}: расхождений нет.'
+                ))
+            elif options['check']:
+                self.stdout.write(self.style.ERROR(
+                    f'{title}: расхождений {mismatched}.'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{title}: исправлено {mismatched}.'
+                ))
+
+    @staticmethod
+    def reconcile(model, field, actual, options):
+        """
+        Проходит таблицу диапазонами id и исправляет записи, у которых
+        счётчик не совпадает с числом связанных строк.
+        """
+        batch_size = options['batch_size']
+        last_id = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        mismatched = 0
+        for start in range(0, last_id + 1, batch_size):
+            broken = list(model.objects.filter(
+                pk__gte=start, pk__lt=start + batch_size,
+            ).annotate(actual=actual).exclude(
+                **{field: F('actual')}
+            ).only('pk', field))
+            mismatched += len(broken)
+            if broken and not options['check']:
+                for obj in broken:
+                    setattr(obj, field, obj.actual)
+                model.objects.bulk_update(broken, [field])
+        return mismatched
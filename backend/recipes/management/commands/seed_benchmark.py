@@ -0,0 +1,263 @@
+import random
+import time
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from PIL import Image
+
+from foodgram.caching import bump_version
+from recipes.caching import INGREDIENTS_CACHE, RECIPES_CACHE
+from recipes.counters import COUNTERS, count_related
+from recipes.models import (
+    FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
+    ShoppingCartIngredient, ShoppingList, Tag,
+)
+from recipes.search import (
+    ingredient_index, recipe_ingredient_index, update_recipe_search,
+)
+from recipes.shopping_cart import get_live_cart_totals
+from users.models import Follow, User
+
+PREFIX = 'bench'
+PASSWORD = 'bench-password'
+IMAGE_NAME = 'recipes/bench.jpg'
+BATCH_SIZE = 1000
+WORDS = (
+    'суп', 'салат', 'пирог', 'рагу', 'каша', 'запеканка', 'омлет',
+    'паста', 'котлеты', 'плов', 'блины', 'соус', 'жаркое', 'торт',
+)
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+)
+TEXT = 'Нарезать, смешать и готовить до готовности. ' * 8
+
+
+def popular(count, rng):
+    """
+    Случайный индекс с убывающей вероятностью: немногие авторы и
+    рецепты собирают большую часть подписок и избранного.
+    """
+    return (int(rng.paretovariate(1.2)) - 1) % count
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, подписками, '
+        'рецептами, избранным и списками покупок для benchmark_api.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=2000,
+            help='Количество ингредиентов, если их в базе меньше.',
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+        )
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Рецептов в избранном на пользователя.',
+        )
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Рецептов в списке покупок на пользователя.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить данные предыдущего заполнения.',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username__startswith=f'{PREFIX}_')
+        if options['clear']:
+            users.delete()
+        elif users.exists():
+            raise CommandError(
+                'Данные уже заполнены; используйте --clear.'
+            )
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'])
+            ingredient_ids = self.create_ingredients(options['ingredients'])
+            tag_ids = self.create_tags()
+            recipe_ids = self.create_recipes(
+                options['recipes'], user_ids, ingredient_ids, tag_ids,
+                options['ingredients_per_recipe'],
+            )
+            self.create_links(Follow, 'author', user_ids, user_ids,
+                              options['follows'])
+            self.create_links(FavoriteRecipe, 'recipe', user_ids, recipe_ids,
+                              options['favorites'])
+            self.create_links(ShoppingList, 'recipe', user_ids, recipe_ids,
+                              options['cart'])
+            self.finish(user_ids, recipe_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(user_ids)}, рецептов: {len(recipe_ids)}, '
+            f'ингредиентов: {len(ingredient_ids)}, '
+            f'{time.perf_counter() - started:.1f} с.'
+        ))
+
+    def bulk_create(self, model, objects):
+        """
+        Вставка пачками не больше batch_size и не больше, чем допускает
+        база в одном запросе.
+        """
+        limit = connection.ops.bulk_batch_size(
+            model._meta.concrete_fields, objects,
+        )
+        model.objects.bulk_create(
+            objects, batch_size=min(self.batch_size, limit or self.batch_size),
+        )
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        self.bulk_create(User, [
+            User(
+                username=f'{PREFIX}_{index}',
+                email=f'{PREFIX}_{index}@example.com',
+                first_name=f'Имя {index}',
+                last_name=f'Фамилия {index}',
+                password=password,
+            )
+            for index in range(count)
+        ])
+        return list(User.objects.filter(
+            username__startswith=f'{PREFIX}_',
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_ingredients(self, count):
+        existing = Ingredient.objects.count()
+        self.bulk_create(Ingredient, [
+            Ingredient(
+                name=f'{PREFIX} ингредиент {index}',
+                measurement_unit=self.rng.choice(('г', 'мл', 'шт')),
+            )
+            for index in range(existing, count)
+        ])
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_tags(self):
+        if not Tag.objects.exists():
+            self.bulk_create(Tag, [
+                Tag(name=name, slug=slug, color=color)
+                for name, slug, color in TAGS
+            ])
+        return list(Tag.objects.values_list('id', flat=True))
+
+    @staticmethod
+    def get_image():
+        """
+        Одно фото на все рецепты: файлы не занимают место, а ссылки
+        в ответах имеют обычную длину.
+        """
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = BytesIO()
+            Image.new('RGB', (640, 480), 'orange').save(buffer, 'JPEG')
+            default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        return IMAGE_NAME
+
+    def create_recipes(self, count, user_ids, ingredient_ids, tag_ids,
+                       per_recipe):
+        image = self.get_image()
+        recipes = [
+            Recipe(
+                name=(
+                    f'{self.rng.choice(WORDS).capitalize()} '
+                    f'{PREFIX} {index}'
+                ),
+                author_id=user_ids[popular(len(user_ids), self.rng)],
+                text=TEXT,
+                image=image,
+                cooking_time=self.rng.randint(5, 180),
+            )
+            for index in range(count)
+        ]
+        self.bulk_create(Recipe, recipes)
+        recipe_ids = list(Recipe.objects.filter(
+            author__username__startswith=f'{PREFIX}_',
+        ).order_by('id').values_list('id', flat=True))
+        per_recipe = min(per_recipe, len(ingredient_ids))
+        self.bulk_create(RecipeIngredient, [
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.rng.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.rng.sample(ingredient_ids, per_recipe)
+        ])
+        self.bulk_create(Recipe.tags.through, [
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.rng.sample(
+                tag_ids, self.rng.randint(1, len(tag_ids)),
+            )
+        ])
+        return recipe_ids
+
+    def create_links(self, model, field, user_ids, target_ids, per_user):
+        """
+        Связи пользователей с популярными объектами: подписки,
+        избранное, списки покупок.
+        """
+        per_user = min(per_user, len(target_ids) - 1)
+        objects = []
+        for user_id in user_ids:
+            chosen = set()
+            while len(chosen) < per_user:
+                target_id = target_ids[popular(len(target_ids), self.rng)]
+                if target_id != user_id or field != 'author':
+                    chosen.add(target_id)
+            objects.extend(
+                model(user_id=user_id, **{f'{field}_id': target_id})
+                for target_id in chosen
+            )
+        self.bulk_create(model, objects)
+
+    def finish(self, user_ids, recipe_ids):
+        """
+        Массовая вставка обходит сигналы: счётчики, суммы списков
+        покупок, поисковые данные и кеши обновляются здесь.
+        """
+        for model, field, related_model, related_field in COUNTERS:
+            model.objects.update(**{
+                field: count_related(related_model, related_field),
+            })
+        for batch in self.batches(user_ids):
+            self.bulk_create(ShoppingCartIngredient, [
+                ShoppingCartIngredient(
+                    user_id=row['recipe__shopping_recipe__user'],
+                    ingredient_id=row['ingredient'],
+                    amount=row['total'],
+                )
+                for row in get_live_cart_totals(batch)
+            ])
+        for batch in self.batches(recipe_ids):
+            update_recipe_search(batch)
+        ingredient_index.invalidate()
+        recipe_ingredient_index.invalidate()
+        bump_version(INGREDIENTS_CACHE)
+        bump_version(RECIPES_CACHE)
+
+    def batches(self, ids):
+        for start in range(0, len(ids), self.batch_size):
+            yield ids[start:start + self.batch_size]
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import RecipeTrend
+from recipes.trending import update_trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает оценки популярности рецептов; подходит для '
+        'запуска по расписанию вместо фонового потока.'
+    )
+
+    def handle(self, *args, **options):
+        if update_trending():
+            self.stdout.write(self.style.SUCCESS(
+                f'Рецептов в рейтинге: {RecipeTrend.objects.count()}.'
+            ))
+        else:
+            self.stdout.write('Рейтинг недавно пересчитан, пропускаю.')
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:35
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRESQL_FORWARD = (
+    'CREATE INDEX recipes_recipe_search_vector_gin '
+    'ON recipes_recipe USING gin (search_vector)',
+    "UPDATE recipes_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', name), 'A') || "
+    "setweight(to_tsvector('russian', text), 'B')",
+)
+POSTGRESQL_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin',
+)
+SQLITE_FORWARD = (
+    'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5(name, text)',
+    'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+    'SELECT id, name, text FROM recipes_recipe',
+)
+SQLITE_BACKWARD = (
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+
+def run_for_vendor(postgresql, sqlite):
+    def operation(apps, schema_editor):
+        statements = {
+            'postgresql': postgresql,
+            'sqlite': sqlite,
+        }.get(schema_editor.connection.vendor, ())
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_for_vendor(POSTGRESQL_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRESQL_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(help_text='Название размера из настроек', max_length=20, verbose_name='Размер')),
+                ('format', models.CharField(max_length=10, verbose_name='Формат')),
+                ('image', models.ImageField(upload_to='recipes/variants/', verbose_name='Изображение')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(verbose_name='Высота')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_variants', to='recipes.Recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Вариант фото',
+                'verbose_name_plural': 'Варианты фото',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeImageTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.CharField(help_text='Фото, для которого строятся варианты', max_length=100, verbose_name='Исходный файл')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Взята в работу')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_tasks', to='recipes.Recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Обработка фото',
+                'verbose_name_plural': 'Обработка фото',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipeimagevariant',
+            constraint=models.UniqueConstraint(fields=('recipe', 'size', 'format'), name='unique_image_variant'),
+        ),
+    ]
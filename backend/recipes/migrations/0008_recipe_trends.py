@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeTrend',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='recipes.Recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(default=0, verbose_name='Оценка')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeTrendState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('computed_at', models.DateTimeField(verbose_name='Учтено до')),
+            ],
+            options={
+                'verbose_name': 'Пересчёт популярности',
+                'verbose_name_plural': 'Пересчёт популярности',
+            },
+        ),
+        migrations.AddField(
+            model_name='favoriterecipe',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Добавлен'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Добавлен'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipetrend',
+            index=models.Index(fields=['-score'], name='recipe_trend_score_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:10
+
+from django.db import migrations
+from django.utils import timezone
+
+STATE_ID = 1
+
+
+def seed_trend_state(apps, schema_editor):
+    """
+    Существующим записям избранного и списков покупок миграция 0008
+    проставила текущее время добавления. Пересчёт начинается с момента
+    миграции, чтобы вся прежняя история не попала в оценки как новые
+    события.
+    """
+    RecipeTrendState = apps.get_model('recipes', 'RecipeTrendState')
+    RecipeTrendState.objects.get_or_create(
+        pk=STATE_ID, defaults={'computed_at': timezone.now()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_trends'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_trend_state, migrations.RunPython.noop),
+    ]
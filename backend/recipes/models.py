@@ -1,6 +1,8 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Prefetch
 
 from foodgram import settings
 from users.models import User
@@ -69,6 +71,36 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """
+    Запросы к рецептам с заранее подгруженными связями.
+    """
+
+    def with_related(self, fields=None):
+        """
+        Автор, теги и ингредиенты загружаются фиксированным числом
+        запросов независимо от количества рецептов. Если передан набор
+        полей ответа, загружаются только нужные связи.
+        """
+        queryset = self
+        if fields is None or 'author' in fields:
+            queryset = queryset.select_related('author')
+        if fields is None or 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if fields is None or 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ))
+        if fields is None or 'image_variants' in fields:
+            queryset = queryset.prefetch_related('image_variants')
+        if fields is not None and 'text' not in fields:
+            return queryset.defer('text')
+        return queryset
+
+
 class Recipe(models.Model):
     """
     Модель рецептов.
@@ -115,9 +147,28 @@ class Recipe(models.Model):
         verbose_name='Время приготовления',
         help_text='Время приготовления блюда',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+        help_text='Сколько пользователей добавили рецепт в избранное',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popular_idx',
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -180,6 +231,11 @@ class FavoriteRecipe(models.Model):
         verbose_name='Пользователь',
         related_name='favorite_user',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Добавлен',
+    )
 
     class Meta:
         constraints = [
@@ -212,6 +268,11 @@ class ShoppingList(models.Model):
         verbose_name='Пользователь',
         related_name='shopping_user',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Добавлен',
+    )
 
     class Meta:
         constraints = [
@@ -226,3 +287,172 @@ class ShoppingList(models.Model):
 
     def __str__(self):
         return f'{self.user}: {self.recipe}'
+
+
+class ShoppingCartIngredient(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+
+    Поддерживается при изменении списка покупок и рецептов в нём.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_cart_ingredients',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='shopping_cart_ingredients',
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество',
+        help_text='Суммарное количество ингредиента',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient',
+            ),
+        ]
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient}'
+
+
+class RecipeImageVariant(models.Model):
+    """
+    Уменьшенная копия фото рецепта в одном из форматов.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+        verbose_name='Рецепт',
+    )
+    size = models.CharField(
+        max_length=20,
+        verbose_name='Размер',
+        help_text='Название размера из настроек',
+    )
+    format = models.CharField(
+        max_length=10,
+        verbose_name='Формат',
+    )
+    image = models.ImageField(
+        upload_to='recipes/variants/',
+        verbose_name='Изображение',
+    )
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'size', 'format'],
+                name='unique_image_variant',
+            ),
+        ]
+        verbose_name = 'Вариант фото'
+        verbose_name_plural = 'Варианты фото'
+
+    def __str__(self):
+        return f'{self.recipe}: {self.size}.{self.format}'
+
+
+class RecipeImageTask(models.Model):
+    """
+    Задача на построение вариантов фото рецепта.
+
+    Очередь хранится в базе: задачи, не выполненные из-за перезапуска
+    процесса, дорабатывает команда process_images.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_tasks',
+        verbose_name='Рецепт',
+    )
+    image = models.CharField(
+        max_length=100,
+        verbose_name='Исходный файл',
+        help_text='Фото, для которого строятся варианты',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана',
+    )
+    started = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Взята в работу',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка',
+    )
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Обработка фото'
+        verbose_name_plural = 'Обработка фото'
+
+    def __str__(self):
+        return f'{self.recipe}: {self.attempts}'
+
+
+class RecipeTrend(models.Model):
+    """
+    Оценка популярности рецепта: добавления в избранное и в список
+    покупок с весом, убывающим со временем.
+
+    Пересчитывается периодически, см. recipes.trending.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField(
+        default=0,
+        verbose_name='Оценка',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='recipe_trend_score_idx'),
+        ]
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score:.3f}'
+
+
+class RecipeTrendState(models.Model):
+    """
+    Время, до которого учтены события в оценках популярности.
+    """
+    computed_at = models.DateTimeField(
+        verbose_name='Учтено до',
+    )
+
+    class Meta:
+        verbose_name = 'Пересчёт популярности'
+        verbose_name_plural = 'Пересчёт популярности'
+
+    def __str__(self):
+        return str(self.computed_at)
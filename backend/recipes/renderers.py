@@ -0,0 +1,33 @@
+from django.utils.encoding import force_str
+from rest_framework.renderers import BaseRenderer
+
+
+class DownloadRenderer(BaseRenderer):
+    """
+    Базовый рендерер для выгрузки файлов.
+
+    Содержимое файла формирует само представление, рендерер нужен для
+    выбора формата через ?format= и заголовок Accept.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return force_str(data).encode(self.charset or 'utf-8')
+
+
+class PlainTextRenderer(DownloadRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(DownloadRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(DownloadRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
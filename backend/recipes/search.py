@@ -0,0 +1,406 @@
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.db import OperationalError, connection, transaction
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+)
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from foodgram import settings
+from .models import Ingredient, Recipe, RecipeIngredient
+
+MAX_CHAR = '\U0010ffff'
+WORD = re.compile(r'\w+')
+PREFIX_BONUS = 1.0
+CONTAINS_BONUS = 0.5
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_FTS_TABLE = 'recipes_recipe_fts'
+NAME_WEIGHT = 10.0
+
+
+def normalize(value):
+    return value.strip().casefold()
+
+
+def trigrams(value):
+    """
+    Триграммы слов строки, как их строит pg_trgm.
+    """
+    result = set()
+    for word in WORD.findall(normalize(value)):
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+def rank(key, query, similarity):
+    score = similarity
+    if key.startswith(query):
+        score += PREFIX_BONUS
+    if query in key:
+        score += CONTAINS_BONUS
+    return score
+
+
+class MemoryIndex:
+    """
+    Основа индексов в памяти процесса.
+
+    Индекс сбрасывается сигналами при изменении данных и считается
+    устаревшим через ttl секунд, чтобы изменения из других процессов
+    тоже попадали в выдачу.
+    """
+    ttl_setting = None
+
+    def __init__(self):
+        self._data = self.empty()
+        self._built_at = None
+        self._loaded = False
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def empty(self):
+        raise NotImplementedError
+
+    def load(self):
+        raise NotImplementedError
+
+    @property
+    def is_ready(self):
+        return (
+            self._built_at is not None
+            and time.monotonic() - self._built_at
+            < getattr(settings, self.ttl_setting)
+        )
+
+    @property
+    def is_loaded(self):
+        """
+        Индекс хотя бы раз построен: его можно отдавать, пока новый
+        строится в фоне.
+        """
+        return self._loaded
+
+    def build(self):
+        generation = self._generation
+        self._data = self.load()
+        self._loaded = True
+        if generation == self._generation:
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        self._generation += 1
+        self._built_at = None
+
+    def warm_up(self, background=True):
+        """
+        Строит устаревший индекс. В фоновом режиме ничего не делает,
+        если индекс уже строится в другом потоке.
+        """
+        if not self._lock.acquire(blocking=not background):
+            return
+        if self.is_ready:
+            self._lock.release()
+            return
+        if not background:
+            try:
+                self.build()
+            finally:
+                self._lock.release()
+            return
+        threading.Thread(target=self._build_in_thread, daemon=True).start()
+
+    def _build_in_thread(self):
+        try:
+            self.build()
+        finally:
+            connection.close()
+            self._lock.release()
+
+
+class IngredientSearchIndex(MemoryIndex):
+    """
+    Индекс названий ингредиентов.
+
+    Названия хранятся отсортированными в нижнем регистре; поиск по
+    началу названия выполняется двоичным поиском, нечёткий поиск —
+    по спискам триграмм.
+    """
+    ttl_setting = 'INGREDIENT_INDEX_TTL'
+
+    def empty(self):
+        return [], [], {}, []
+
+    def load(self):
+        rows = sorted(
+            (normalize(name), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit',
+            )
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        postings = defaultdict(list)
+        sizes = []
+        for index, key in enumerate(keys):
+            grams = trigrams(key)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(index)
+        return keys, items, dict(postings), sizes
+
+    def search(self, query, limit):
+        """
+        Ингредиенты, название которых совпадает с запросом, начинается
+        с него или содержит его, именно в таком порядке.
+        """
+        query = normalize(query)
+        keys, items, _, _ = self._data
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + MAX_CHAR, start)
+        result = items[start:min(end, start + limit)]
+        if len(result) < limit:
+            contains = sorted(
+                (key.find(query), key, index)
+                for index, key in enumerate(keys)
+                if query in key and not key.startswith(query)
+            )
+            result += [
+                items[index]
+                for _, _, index in contains[:limit - len(result)]
+            ]
+        return result
+
+    def fuzzy_search(self, query, limit, budget):
+        """
+        Ингредиенты, похожие на запрос, по убыванию оценки: похожесть
+        по триграммам плюс надбавки за совпадение начала и вхождение.
+
+        Списки триграмм обходятся от редких к частым; если бюджет
+        времени в секундах исчерпан, оценка строится по уже
+        просмотренным спискам.
+        """
+        keys, items, postings, sizes = self._data
+        deadline = time.monotonic() + budget
+        query_grams = trigrams(query)
+        query = normalize(query)
+        shared = Counter()
+        for gram in sorted(
+            query_grams, key=lambda gram: len(postings.get(gram, ()))
+        ):
+            shared.update(postings.get(gram, ()))
+            if time.monotonic() > deadline:
+                break
+        scored = []
+        for index, common in shared.items():
+            similarity = common / (
+                len(query_grams) + sizes[index] - common
+            )
+            key = keys[index]
+            if (
+                similarity >= settings.INGREDIENT_SIMILARITY_THRESHOLD
+                or query in key
+            ):
+                scored.append((-rank(key, query, similarity), key, index))
+        scored.sort()
+        return [items[index] for _, _, index in scored[:limit]]
+
+
+class RecipeIngredientIndex(MemoryIndex):
+    """
+    Обратный индекс: ингредиент -> отсортированный массив id рецептов.
+
+    Подбор рецептов по имеющимся ингредиентам обходит только списки
+    запрошенных ингредиентов, не затрагивая остальной каталог.
+    """
+    ttl_setting = 'RECIPE_INDEX_TTL'
+
+    def empty(self):
+        return {}, {}
+
+    def load(self):
+        postings = {}
+        recipes = defaultdict(list)
+        rows = RecipeIngredient.objects.values_list(
+            'ingredient_id', 'recipe_id',
+        ).order_by('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.iterator():
+            postings.setdefault(ingredient_id, array('I')).append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        return postings, {
+            recipe_id: tuple(ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+
+    def update_recipe(self, recipe_id, ingredient_ids):
+        """
+        Заменяет ингредиенты рецепта в индексе; пустой список удаляет
+        рецепт.
+        """
+        if not self.is_ready:
+            self.invalidate()
+            return
+        postings, recipes = self._data
+        for ingredient_id in recipes.pop(recipe_id, ()):
+            posting = postings[ingredient_id]
+            del posting[bisect_left(posting, recipe_id)]
+        for ingredient_id in ingredient_ids:
+            insort(postings.setdefault(ingredient_id, array('I')), recipe_id)
+        if ingredient_ids:
+            recipes[recipe_id] = tuple(ingredient_ids)
+
+    def match(self, ingredient_ids):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов, с долей
+        имеющихся ингредиентов и числом недостающих: сначала наиболее
+        полные, затем с меньшим числом недостающих, затем новые.
+        """
+        postings, recipes = self._data
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(postings.get(ingredient_id, ()))
+        result = []
+        for recipe_id, count in matched.items():
+            size = len(recipes[recipe_id])
+            result.append((count / size, size - count, recipe_id))
+        result.sort(key=lambda item: (-item[0], item[1], -item[2]))
+        return result
+
+
+def index_recipe_ingredients(recipe_id, ingredient_ids):
+    """
+    Обновляет обратный индекс после фиксации транзакции.
+    """
+    ingredient_ids = tuple(ingredient_ids)
+    transaction.on_commit(lambda: recipe_ingredient_index.update_recipe(
+        recipe_id, ingredient_ids,
+    ))
+
+
+def fuzzy_search_database(query, limit, budget):
+    """
+    Нечёткий поиск через pg_trgm и GIN-индекс по названию.
+
+    Если запрос не укладывается в бюджет времени, возвращается поиск
+    по началу названия.
+    """
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    queryset = Ingredient.objects.filter(
+        Q(name__trigram_similar=query) | Q(name__icontains=query)
+    ).annotate(
+        score=TrigramSimilarity('name', query) + Case(
+            When(name__istartswith=query, then=Value(
+                PREFIX_BONUS + CONTAINS_BONUS
+            )),
+            When(name__icontains=query, then=Value(CONTAINS_BONUS)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    ).order_by(F('score').desc(), 'name').values(
+        'id', 'name', 'measurement_unit',
+    )
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'SET LOCAL statement_timeout = %s', [int(budget * 1000)]
+            )
+            return list(queryset[:limit])
+    except OperationalError:
+        return list(Ingredient.objects.filter(
+            name__istartswith=query,
+        ).order_by('name').values('id', 'name', 'measurement_unit')[:limit])
+
+
+def fuzzy_search(query, limit):
+    budget = settings.INGREDIENT_SEARCH_BUDGET_MS / 1000
+    if connection.vendor == 'postgresql':
+        return fuzzy_search_database(query, limit, budget)
+    if not ingredient_index.is_ready:
+        ingredient_index.warm_up(background=False)
+    return ingredient_index.fuzzy_search(query, limit, budget)
+
+
+ingredient_index = IngredientSearchIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+def update_recipe_search(recipe_ids):
+    """
+    Обновляет полнотекстовый индекс рецептов после их сохранения.
+    """
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            search_vector=(
+                SearchVector(
+                    'name', weight='A', config=RECIPE_SEARCH_CONFIG,
+                )
+                + SearchVector(
+                    'text', weight='B', config=RECIPE_SEARCH_CONFIG,
+                )
+            ),
+        )
+    elif connection.vendor == 'sqlite':
+        delete_recipe_search(recipe_ids)
+        rows = Recipe.objects.filter(
+            id__in=recipe_ids,
+        ).values_list('id', 'name', 'text')
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {RECIPE_FTS_TABLE} (rowid, name, text) '
+                'VALUES (%s, %s, %s)',
+                list(rows),
+            )
+
+
+def delete_recipe_search(recipe_ids):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {RECIPE_FTS_TABLE} WHERE rowid = %s',
+            [(recipe_id,) for recipe_id in recipe_ids],
+        )
+
+
+def search_recipes(queryset, query):
+    """
+    Рецепты, подходящие под поисковый запрос, по убыванию релевантности.
+
+    В PostgreSQL используется tsvector с русской морфологией и
+    GIN-индексом, в SQLite — таблица FTS5.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=RECIPE_SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+        ).order_by('-rank', '-id')
+    words = WORD.findall(normalize(query))
+    if not words:
+        return queryset.none()
+    match = ' '.join(
+        '"{}"*'.format(word.replace('"', '""')) for word in words
+    )
+    table = Recipe._meta.db_table
+    return queryset.extra(
+        where=[
+            f'{table}.id IN (SELECT rowid FROM {RECIPE_FTS_TABLE} '
+            f'WHERE {RECIPE_FTS_TABLE} MATCH %s)',
+        ],
+        params=[match],
+    ).annotate(rank=RawSQL(
+        f'SELECT bm25({RECIPE_FTS_TABLE}, {NAME_WEIGHT}, 1.0) '
+        f'FROM {RECIPE_FTS_TABLE} '
+        f'WHERE {RECIPE_FTS_TABLE} MATCH %s '
+        f'AND rowid = {table}.id',
+        (match,),
+    )).order_by('rank', '-id')
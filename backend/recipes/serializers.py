@@ -1,16 +1,67 @@
+from collections import Counter, namedtuple
+
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
-from django.db import transaction
+from django.db import models, transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from .models import (
-    Tag, Ingredient, RecipeIngredient, Recipe, FavoriteRecipe, ShoppingList
-)
+from .caching import get_base_keys, invalidate_recipes
+from .images import enqueue_recipe_image, get_variant_urls
+from .models import Tag, Ingredient, RecipeIngredient, Recipe
+from .search import index_recipe_ingredients
+from .shopping_cart import update_recipe_cart_totals
 from users.models import Follow
-from foodgram.settings import MIN_AMOUNT_INGREDIENT, MIN_COOKING_TIME
+from foodgram.instrumentation import timed
+from foodgram.relations import get_viewer_relations
+from foodgram.settings import (
+    MIN_AMOUNT_INGREDIENT, MIN_COOKING_TIME, RECIPE_IMAGE_MAX_PIXELS,
+    RECIPE_IMAGE_MAX_UPLOAD_SIZE, RESPONSE_CACHE_TIMEOUT,
+)
 from users.serializers import UserSerializer
 
+# Что изменилось при редактировании рецепта: сохранённые поля,
+# id ингредиентов (добавлены, изменено количество, удалены) и id тегов
+# (добавлены, удалены).
+RecipeChanges = namedtuple('RecipeChanges', 'fields ingredients tags')
+
+
+def get_requested_fields(request):
+    """
+    Поля, перечисленные в параметре ?fields=, или None, если
+    запрошены все поля.
+    """
+    if request is None or not request.query_params.get('fields'):
+        return None
+    return {
+        field.strip()
+        for field in request.query_params['fields'].split(',')
+        if field.strip()
+    }
+
+
+class SparseFieldsMixin:
+    """
+    Оставляет в ответе только поля из ?fields= (для корневого
+    сериализатора и элементов списка).
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+        requested = get_requested_fields(self.context.get('request'))
+        if requested is None:
+            return fields
+        return {
+            name: field for name, field in fields.items()
+            if name in requested
+        }
+
 
 class TagSerializer(serializers.ModelSerializer):
     """
@@ -69,10 +120,11 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 class RecipeCreateIngredientSerializer(serializers.ModelSerializer):
     """
     Сериализатор для ингредиентов при создании рецепта.
+
+    id проверяются сразу для всего списка в
+    RecipeCreateSerializer.validate_ingredients.
     """
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-    )
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         validators=(MinValueValidator(MIN_AMOUNT_INGREDIENT),)
     )
@@ -86,9 +138,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     """
     Сериализатор для создания рецептов.
     """
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
     )
     author = UserSerializer(
         read_only=True,
@@ -137,6 +188,61 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             ingredient_list.append(recipe_ingredient)
         RecipeIngredient.objects.bulk_create(ingredient_list)
 
+    @staticmethod
+    def validate_ingredients(ingredients):
+        """
+        Все ингредиенты загружаются одним запросом; отсутствующие id и
+        повторы возвращаются одной ошибкой.
+        """
+        ids = [ingredient['id'] for ingredient in ingredients]
+        found = Ingredient.objects.in_bulk(ids)
+        errors = []
+        missing = sorted(set(ids) - found.keys())
+        if missing:
+            errors.append(f'Ингредиентов с id {missing} не существует.')
+        duplicates = sorted(
+            ingredient_id
+            for ingredient_id, total in Counter(ids).items() if total > 1
+        )
+        if duplicates:
+            errors.append(f'Ингредиенты с id {duplicates} указаны повторно.')
+        if errors:
+            raise serializers.ValidationError(errors)
+        for ingredient in ingredients:
+            ingredient['id'] = found[ingredient['id']]
+        return ingredients
+
+    @staticmethod
+    def validate_tags(tags):
+        """
+        Все теги загружаются одним запросом.
+        """
+        found = Tag.objects.in_bulk(tags)
+        missing = sorted(set(tags) - found.keys())
+        if missing:
+            raise serializers.ValidationError(
+                f'Тегов с id {missing} не существует.'
+            )
+        return [found[tag_id] for tag_id in dict.fromkeys(tags)]
+
+    @staticmethod
+    def validate_image(image):
+        """
+        Размеры проверяются по заголовку, уже прочитанному при
+        валидации поля, без повторного декодирования.
+        """
+        if image.size > RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                'Размер фото не должен превышать '
+                f'{RECIPE_IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)} МБ.'
+            )
+        width, height = image.image.size
+        if width * height > RECIPE_IMAGE_MAX_PIXELS:
+            raise serializers.ValidationError(
+                'Слишком большое разрешение фото.'
+            )
+        return image
+
     @transaction.atomic
     def create(self, validated_data):
         """
@@ -147,28 +253,179 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        index_recipe_ingredients(recipe.id, [
+            ingredient['id'].id for ingredient in ingredients
+        ])
+        enqueue_recipe_image(recipe)
         return recipe
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.with_related().get(id=instance.id)
         return RecipeShowSerializer(instance, context=context).data
 
+    @staticmethod
+    def update_ingredients(recipe, new):
+        """
+        Приводит ингредиенты рецепта к вектору new: добавляет новые
+        строки, меняет количество в изменившихся и удаляет лишние, не
+        трогая остальные. Возвращает прежний вектор и id изменённых
+        ингредиентов.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe,
+            )
+        }
+        old = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        }
+        added = [
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount,
+            )
+            for ingredient_id, amount in new.items()
+            if ingredient_id not in current
+        ]
+        updated = [
+            current[ingredient_id]
+            for ingredient_id, amount in new.items()
+            if ingredient_id in current and old[ingredient_id] != amount
+        ]
+        for recipe_ingredient in updated:
+            recipe_ingredient.amount = new[recipe_ingredient.ingredient_id]
+        removed = sorted(old.keys() - new.keys())
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed,
+            ).delete()
+        RecipeIngredient.objects.bulk_create(added)
+        RecipeIngredient.objects.bulk_update(updated, ['amount'])
+        return old, (
+            [item.ingredient_id for item in added],
+            [item.ingredient_id for item in updated],
+            removed,
+        )
+
+    @staticmethod
+    def update_tags(recipe, tags):
+        """
+        Добавляет недостающие теги рецепта и убирает лишние.
+        """
+        current = set(recipe.tags.values_list('id', flat=True))
+        new = {tag.id for tag in tags}
+        recipe.tags.remove(*current - new)
+        recipe.tags.add(*new - current)
+        return sorted(new - current), sorted(current - new)
+
     @transaction.atomic
     def update(self, recipe, validated_data):
         """
         Редактирование рецепта.
+
+        Меняются только отличающиеся поля и строки связей; перечень
+        изменений сохраняется в self.changes.
         """
-        recipe.ingredients.clear()
-        recipe.tags.clear()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        self.create_ingredients(ingredients, recipe)
-        recipe.tags.set(tags)
-        return super().update(recipe, validated_data)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        changed_ingredients = ([], [], [])
+        if ingredients is not None:
+            new_vector = {
+                ingredient['id'].id: ingredient['amount']
+                for ingredient in ingredients
+            }
+            old_vector, changed_ingredients = self.update_ingredients(
+                recipe, new_vector,
+            )
+        changes = RecipeChanges(
+            fields=[
+                name for name, value in validated_data.items()
+                if getattr(recipe, name) != value
+            ],
+            ingredients=changed_ingredients,
+            tags=self.update_tags(recipe, tags) if tags is not None
+            else ([], []),
+        )
+        self.changes = changes
+        added, updated, removed = changes.ingredients
+        if added or updated or removed:
+            update_recipe_cart_totals(recipe, old_vector, new_vector)
+        if added or removed:
+            index_recipe_ingredients(recipe.id, new_vector)
+        if changes.fields:
+            for name in changes.fields:
+                setattr(recipe, name, validated_data[name])
+            recipe.save(update_fields=changes.fields)
+        elif any(changes.ingredients) or any(changes.tags):
+            invalidate_recipes([recipe.id])
+        if 'image' in changes.fields:
+            enqueue_recipe_image(recipe)
+        return recipe
 
 
-class RecipeShowSerializer(serializers.ModelSerializer):
+class RecipeShowListSerializer(serializers.ListSerializer):
+    """
+    Список рецептов, собранный из закешированных базовых представлений.
+
+    Базовое представление рецепта сериализуется один раз на версию
+    рецепта; поля, зависящие от пользователя, накладываются поверх
+    по множествам id из ViewerRelations.
+    """
+
+    @timed('serializer')
+    def to_representation(self, data):
+        request = self.context.get('request')
+        if isinstance(data, models.Manager):
+            data = data.all()
+        recipes = list(data)
+        if get_requested_fields(request) is not None:
+            return super().to_representation(recipes)
+        keys = get_base_keys(request, [recipe.id for recipe in recipes])
+        cached = cache.get_many(list(keys.values()))
+        missing = [
+            recipe for recipe in recipes if keys[recipe.id] not in cached
+        ]
+        if missing:
+            built = {
+                keys[recipe_id]: item
+                for recipe_id, item in self.build_base(missing).items()
+            }
+            cache.set_many(built, RESPONSE_CACHE_TIMEOUT)
+            cached.update(built)
+        relations = get_viewer_relations(self.context)
+        result = []
+        for recipe in recipes:
+            item = cached[keys[recipe.id]]
+            item['is_favorited'] = relations.is_favorited(recipe.id)
+            item['is_in_shopping_cart'] = relations.is_in_shopping_cart(
+                recipe.id
+            )
+            item['author']['is_subscribed'] = relations.is_subscribed(
+                item['author']['id']
+            )
+            result.append(item)
+        return result
+
+    def build_base(self, recipes):
+        """
+        Представления рецептов, которых нет в кеше. Рецепты, загруженные
+        не полностью, перечитываются со всеми связями.
+        """
+        loaded = Recipe.objects.with_related().in_bulk([
+            recipe.id for recipe in recipes if recipe.get_deferred_fields()
+        ])
+        return {
+            recipe.id: self.child.to_representation(
+                loaded.get(recipe.id, recipe)
+            )
+            for recipe in recipes
+        }
+
+
+class RecipeShowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для отображения рецептов.
     """
@@ -184,7 +441,8 @@ class RecipeShowSerializer(serializers.ModelSerializer):
         read_only=True,
         source='recipe_ingredient',
     )
-    image = Base64ImageField()
+    image = serializers.ImageField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -197,30 +455,35 @@ class RecipeShowSerializer(serializers.ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
+            'favorites_count',
             'is_favorited',
             'is_in_shopping_cart',
         )
+        list_serializer_class = RecipeShowListSerializer
+
+    @timed('serializer')
+    def to_representation(self, instance):
+        return super().to_representation(instance)
+
+    def get_image_variants(self, obj):
+        return get_variant_urls(obj, self.context.get('request'))
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return FavoriteRecipe.objects.filter(user=user, recipe=obj).exists()
+        return get_viewer_relations(self.context).is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return ShoppingList.objects.filter(user=user, recipe=obj).exists()
+        return get_viewer_relations(self.context).is_in_shopping_cart(obj.id)
 
 
 class RecipeListSerializer(serializers.ModelSerializer):
     """
     Сериализатор для отображения рецептов в подписке.
     """
-    image = Base64ImageField()
+    image = serializers.ImageField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -228,9 +491,13 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time',
         )
 
+    def get_image_variants(self, obj):
+        return get_variant_urls(obj, self.context.get('request'))
+
 
 class SubscriptionSerializer(serializers.ModelSerializer):
     """
@@ -265,19 +532,23 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         fields = ('id', 'email', 'username', 'first_name',
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count',)
 
+    @timed('serializer')
+    def to_representation(self, instance):
+        return super().to_representation(instance)
+
     def get_recipes(self, obj):
-        recipes = obj.author.recipes.all()
+        recipes = getattr(obj.author, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.author.recipes.all()[
+                :self.context.get('recipes_limit')
+            ]
         return RecipeListSerializer(recipes, many=True).data
 
     def get_is_subscribed(self, obj):
-        subscribe = Follow.objects.filter(
-            user=self.context.get('request').user,
-            author=obj.author
+        return get_viewer_relations(self.context).is_subscribed(
+            obj.author_id
         )
-        if subscribe:
-            return True
-        return False
 
     @staticmethod
     def get_recipes_count(obj):
-        return obj.author.recipes.count()
+        return obj.author.recipes_count
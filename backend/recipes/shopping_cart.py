@@ -0,0 +1,257 @@
+import csv
+import json
+from hashlib import md5
+from io import BytesIO
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.http import http_date
+
+from foodgram import settings
+from users.models import User
+from .models import RecipeIngredient, ShoppingCartIngredient
+
+TITLE = 'Список продуктов к покупке'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+
+
+def get_cart_ingredients(user):
+    """
+    Суммарное количество каждого ингредиента в списке покупок.
+
+    Строки читаются итератором, без загрузки всей выборки в память.
+    """
+    return ShoppingCartIngredient.objects.filter(
+        user=user,
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount',
+    ).order_by('ingredient__name').iterator()
+
+
+def get_live_cart_totals(users):
+    """
+    Суммы ингредиентов, посчитанные по рецептам в списках покупок.
+    """
+    return RecipeIngredient.objects.filter(
+        recipe__shopping_recipe__user__in=users,
+    ).values(
+        'recipe__shopping_recipe__user', 'ingredient',
+    ).annotate(total=Sum('amount')).order_by()
+
+
+def get_recipe_vector(recipe):
+    """
+    Количество каждого ингредиента в рецепте.
+    """
+    return dict(
+        RecipeIngredient.objects.filter(
+            recipe=recipe,
+        ).values_list('ingredient_id', 'amount')
+    )
+
+
+@transaction.atomic
+def change_cart_totals(users, vector):
+    """
+    Прибавляет к суммам в списках покупок пользователей вектор
+    ингредиентов; отрицательные значения вычитаются.
+
+    Строки сумм блокируются и обновляются одним запросом, суммы,
+    дошедшие до нуля, удаляются.
+    """
+    vector = {
+        ingredient_id: amount
+        for ingredient_id, amount in vector.items() if amount
+    }
+    if not vector:
+        return
+    user_ids = list(users.values_list('id', flat=True))
+    ShoppingCartIngredient.objects.bulk_create(
+        [
+            ShoppingCartIngredient(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+            )
+            for user_id in user_ids
+            for ingredient_id, amount in vector.items() if amount > 0
+        ],
+        ignore_conflicts=True,
+    )
+    totals = ShoppingCartIngredient.objects.filter(
+        user_id__in=user_ids,
+        ingredient_id__in=vector,
+    )
+    changed = []
+    empty = []
+    for total in totals.select_for_update():
+        total.amount += vector[total.ingredient_id]
+        if total.amount > 0:
+            changed.append(total)
+        else:
+            empty.append(total.id)
+    ShoppingCartIngredient.objects.bulk_update(changed, ['amount'])
+    if empty:
+        ShoppingCartIngredient.objects.filter(id__in=empty).delete()
+
+
+def add_to_cart_totals(user_id, recipe_id):
+    change_cart_totals(
+        User.objects.filter(id=user_id),
+        get_recipe_vector(recipe_id),
+    )
+
+
+def remove_from_cart_totals(user_id, recipe_id):
+    change_cart_totals(
+        User.objects.filter(id=user_id),
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in get_recipe_vector(recipe_id).items()
+        },
+    )
+
+
+def update_recipe_cart_totals(recipe, old_vector, new_vector):
+    """
+    Переносит изменение состава рецепта в списки покупок,
+    где этот рецепт есть.
+    """
+    vector = Counter(new_vector)
+    vector.subtract(old_vector)
+    users = User.objects.filter(shopping_user__recipe=recipe)
+    change_cart_totals(users, vector)
+    if any(vector.values()):
+        users.update(shopping_cart_updated=timezone.now())
+
+
+def get_cart_validators(user, file_format):
+    """
+    ETag и Last-Modified для выгрузки списка покупок.
+
+    ETag — хеш самих строк списка, поэтому меняется при любом изменении
+    содержимого, даже если время изменения списка не обновилось.
+    Last-Modified берётся из времени последнего изменения списка.
+    """
+    updated = user.shopping_cart_updated
+    if updated is None:
+        return None, None
+    content = md5(f'{user.id}:{file_format}'.encode())
+    for row in ShoppingCartIngredient.objects.filter(user=user).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount',
+    ).order_by('ingredient__name', 'ingredient_id').iterator():
+        content.update(json.dumps(row, ensure_ascii=False).encode())
+    return f'"{content.hexdigest()}"', int(updated.timestamp())
+
+
+def write_txt(ingredients):
+    yield f'{TITLE}:\r\n'
+    for ingredient in ingredients:
+        yield (
+            f'{ingredient["ingredient__name"]} '
+            f'- {ingredient["amount"]} '
+            f'{ingredient["ingredient__measurement_unit"]}\r\n'
+        )
+
+
+class Echo:
+    """
+    Псевдобуфер для csv.writer: возвращает записанную строку.
+    """
+
+    def write(self, value):
+        return value
+
+
+def write_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['amount'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+def write_json(ingredients):
+    yield '['
+    separator = ''
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'amount': ingredient['amount'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+def get_pdf_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    try:
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT)
+        )
+    except Exception:
+        return 'Helvetica'
+    return PDF_FONT_NAME
+
+
+def write_pdf(ingredients):
+    """
+    PDF собирается целиком: формат не позволяет отдавать страницы
+    до завершения документа.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    font = get_pdf_font()
+    width, height = A4
+    lines = (
+        f'{ingredient["ingredient__name"]} - {ingredient["amount"]} '
+        f'{ingredient["ingredient__measurement_unit"]}'
+        for ingredient in ingredients
+    )
+    pdf.setFont(font, PDF_FONT_SIZE)
+    pdf.drawString(PDF_MARGIN, height - PDF_MARGIN, f'{TITLE}:')
+    position = height - PDF_MARGIN - PDF_LINE_HEIGHT
+    for line in lines:
+        if position < PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont(font, PDF_FONT_SIZE)
+            position = height - PDF_MARGIN
+        pdf.drawString(PDF_MARGIN, position, line)
+        position -= PDF_LINE_HEIGHT
+    pdf.save()
+    yield buffer.getvalue()
+
+
+WRITERS = {
+    'txt': write_txt,
+    'csv': write_csv,
+    'json': write_json,
+    'pdf': write_pdf,
+}
+
+
+def set_validators(response, etag, last_modified):
+    if etag is not None:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,177 @@
+from django.core.cache import cache
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from foodgram.caching import bump_version
+from users.models import Follow, User
+from .caching import INGREDIENTS_CACHE, TAGS_CACHE, invalidate_recipes
+from .counters import change_counter
+from .filters import TAG_IDS_CACHE_KEY
+from .models import FavoriteRecipe, Ingredient, Recipe, ShoppingList, Tag
+from .search import (
+    delete_recipe_search, index_recipe_ingredients, ingredient_index,
+    update_recipe_search,
+)
+from .shopping_cart import add_to_cart_totals, remove_from_cart_totals
+
+
+def touch_shopping_carts(users):
+    """
+    Отмечает списки покупок пользователей как изменённые.
+    """
+    users.update(shopping_cart_updated=timezone.now())
+
+
+@receiver(pre_save, sender=ShoppingList)
+def shopping_list_moved(sender, instance, **kwargs):
+    """
+    Запись списка покупок, перенесённая в админке к другому
+    пользователю или рецепту, уходит из сумм прежнего списка.
+    """
+    instance.moved = False
+    if instance.pk is None:
+        return
+    old = ShoppingList.objects.filter(pk=instance.pk).values_list(
+        'user_id', 'recipe_id',
+    ).first()
+    if old is not None and old != (instance.user_id, instance.recipe_id):
+        remove_from_cart_totals(*old)
+        instance.moved = True
+
+
+@receiver(post_save, sender=ShoppingList)
+def shopping_list_added(sender, instance, created, **kwargs):
+    if created or instance.moved:
+        add_to_cart_totals(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def shopping_list_deleted(sender, instance, **kwargs):
+    """
+    При каскадном удалении рецепта или пользователя pre_delete
+    приходит до удаления строк, поэтому состав рецепта ещё доступен.
+    """
+    remove_from_cart_totals(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+def shopping_list_changed(sender, instance, **kwargs):
+    touch_shopping_carts(User.objects.filter(id=instance.user_id))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_changed(sender, instance, update_fields, **kwargs):
+    if update_fields is None or {'name', 'text'} & update_fields:
+        update_recipe_search([instance.id])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_search_deleted(sender, instance, **kwargs):
+    delete_recipe_search([instance.id])
+    index_recipe_ingredients(instance.id, ())
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, created, **kwargs):
+    if not created:
+        touch_shopping_carts(
+            User.objects.filter(shopping_user__recipe=instance)
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        touch_shopping_carts(User.objects.filter(
+            shopping_user__recipe__recipe_ingredient__ingredient=instance
+        ))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_index_changed(sender, **kwargs):
+    ingredient_index.invalidate()
+    bump_version(INGREDIENTS_CACHE)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    cache.delete(TAG_IDS_CACHE_KEY)
+    bump_version(TAGS_CACHE)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_cache_changed(sender, instance, **kwargs):
+    invalidate_recipes([instance.id])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_recipes_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_recipes(Recipe.objects.filter(
+            tags=instance,
+        ).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_recipes_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_recipes(Recipe.objects.filter(
+            ingredients=instance,
+        ).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    invalidate_recipes(Recipe.objects.filter(
+        author=instance,
+    ).values_list('id', flat=True))
+
+
+def get_delta(signal, created):
+    """
+    Изменение счётчика: +1 при создании, -1 при удалении, 0 при
+    сохранении существующей записи.
+    """
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+def favorite_changed(sender, instance, signal, created=False, **kwargs):
+    delta = get_delta(signal, created)
+    if delta:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', delta)
+        # Каждое добавление в избранное сбрасывало бы все списки
+        # рецептов; в закешированных списках счётчик обновится через
+        # RECIPE_LIST_CACHE_TIMEOUT.
+        invalidate_recipes([instance.recipe_id], lists=False)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def author_recipes_changed(sender, instance, signal, created=False, **kwargs):
+    delta = get_delta(signal, created)
+    if delta:
+        change_counter(User, instance.author_id, 'recipes_count', delta)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, signal, created=False, **kwargs):
+    delta = get_delta(signal, created)
+    if delta:
+        change_counter(User, instance.author_id, 'followers_count', delta)
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from foodgram import settings
+from .models import FavoriteRecipe, RecipeTrend, RecipeTrendState, ShoppingList
+
+logger = logging.getLogger(__name__)
+
+STATE_ID = 1
+
+EVENTS = (
+    (FavoriteRecipe, 1.0),
+    (ShoppingList, 0.5),
+)
+
+
+def decay(seconds):
+    return 0.5 ** (seconds / settings.TRENDING_HALF_LIFE)
+
+
+def update_trending(now=None):
+    """
+    Досчитывает оценки популярности до текущего момента.
+
+    Все оценки уменьшаются одним UPDATE на время, прошедшее с прошлого
+    пересчёта, затем добавляются новые события. События учитываются с
+    задержкой TRENDING_LAG, чтобы не пропустить ещё не зафиксированные
+    транзакции. Если другой процесс пересчитывал оценки недавно,
+    ничего не делает.
+    """
+    until = (now or timezone.now()) - timedelta(
+        seconds=settings.TRENDING_LAG
+    )
+    RecipeTrendState.objects.get_or_create(pk=STATE_ID, defaults={
+        'computed_at': until - timedelta(seconds=settings.TRENDING_WINDOW),
+    })
+    with transaction.atomic():
+        state = RecipeTrendState.objects.select_for_update().get(pk=STATE_ID)
+        elapsed = (until - state.computed_at).total_seconds()
+        if elapsed < settings.TRENDING_INTERVAL / 2:
+            return False
+        RecipeTrend.objects.update(score=F('score') * decay(elapsed))
+        scores = Counter()
+        for model, weight in EVENTS:
+            events = model.objects.filter(
+                created__gt=state.computed_at, created__lte=until,
+            ).values_list('recipe_id', 'created')
+            for recipe_id, created in events.iterator():
+                scores[recipe_id] += weight * decay(
+                    (until - created).total_seconds()
+                )
+        add_scores(scores)
+        RecipeTrend.objects.filter(
+            score__lt=settings.TRENDING_MIN_SCORE,
+        ).delete()
+        state.computed_at = until
+        state.save()
+    return True
+
+
+def add_scores(scores):
+    trends = RecipeTrend.objects.in_bulk(list(scores))
+    for recipe_id, trend in trends.items():
+        trend.score += scores[recipe_id]
+    RecipeTrend.objects.bulk_update(trends.values(), ['score'])
+    RecipeTrend.objects.bulk_create(
+        RecipeTrend(recipe_id=recipe_id, score=score)
+        for recipe_id, score in scores.items()
+        if recipe_id not in trends
+    )
+
+
+class TrendingJob:
+    """
+    Фоновый поток процесса, пересчитывающий оценки сразу после
+    запуска и затем раз в TRENDING_INTERVAL секунд.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Запускает поток, если он ещё не запущен. Возвращает True, если
+        поток запущен этим вызовом.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            return True
+
+    @staticmethod
+    def _run():
+        while True:
+            try:
+                update_trending()
+            except Exception:
+                logger.exception('Не удалось пересчитать популярность')
+            finally:
+                connection.close()
+            time.sleep(settings.TRENDING_INTERVAL)
+
+
+trending_job = TrendingJob()
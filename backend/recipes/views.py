@@ -1,24 +1,37 @@
 from http import HTTPStatus
 
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from foodgram import settings
+from foodgram.caching import cached_response
 from foodgram.paginators import PageLimitPagination
-from .filters import IngredientFilter, RecipeFilter
-from .models import (
-    FavoriteRecipe, Ingredient, Recipe, RecipeIngredient, ShoppingList, Tag
+from .caching import (
+    INGREDIENTS_CACHE, RECIPES_CACHE, TAGS_CACHE, get_recipe_cache,
 )
+from .filters import IngredientFilter, RecipeFilter, RecipeOrderingFilter
+from .models import FavoriteRecipe, Ingredient, Recipe, ShoppingList, Tag
 from .permissions import AuthorOrReadOnly, AdminOrReadOnly
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from .search import (
+    fuzzy_search, ingredient_index, recipe_ingredient_index
+)
 from .serializers import (
     IngredientSerializer, RecipeCreateSerializer, RecipeShowSerializer,
-    RecipeListSerializer, TagSerializer,
+    RecipeListSerializer, TagSerializer, get_requested_fields,
+)
+from .shopping_cart import (
+    WRITERS, get_cart_ingredients, get_cart_validators, set_validators,
 )
+from .trending import trending_job
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -30,6 +43,14 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AdminOrReadOnly,)
     pagination_class = None
 
+    @cached_response(TAGS_CACHE)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response(TAGS_CACHE)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -42,6 +63,29 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    @cached_response(INGREDIENTS_CACHE)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @cached_response(INGREDIENTS_CACHE)
+    def list(self, request, *args, **kwargs):
+        search = request.query_params.get('search')
+        if search:
+            return Response(fuzzy_search(
+                search, settings.INGREDIENT_SEARCH_LIMIT
+            ))
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        # Ответ попадает в кеш, поэтому строится только по актуальному
+        # индексу: выборка из базы без поиска по вхождению и без
+        # ранжирования закешировалась бы вместо него.
+        if not ingredient_index.is_ready:
+            ingredient_index.warm_up(background=False)
+        return Response(ingredient_index.search(
+            name, settings.INGREDIENT_SEARCH_LIMIT
+        ))
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """
@@ -51,14 +95,38 @@ class RecipeViewSet(viewsets.ModelViewSet):
     serializer_class = RecipeShowSerializer
     permission_classes = (AuthorOrReadOnly,)
     pagination_class = PageLimitPagination
-    filter_backends = (DjangoFilterBackend,)
+    max_page_size = settings.RECIPES_MAX_PAGE_SIZE
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('favorites_count', 'id')
+    feed_actions = ['list', 'by_ingredients', 'trending']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = get_requested_fields(self.request)
+        if self.action in self.feed_actions and fields is None:
+            return queryset.only('id')
+        if self.action in self.feed_actions + ['retrieve']:
+            return queryset.with_related(fields)
+        return queryset
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in self.feed_actions + ['retrieve']:
             return RecipeShowSerializer
         return RecipeCreateSerializer
 
+    @cached_response(
+        RECIPES_CACHE,
+        anonymous_only=True,
+        timeout=settings.RECIPE_LIST_CACHE_TIMEOUT,
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response(get_recipe_cache, anonymous_only=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -82,6 +150,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.add_recipe(ShoppingList, request, pk)
         return self.delete_recipe(ShoppingList, request, pk)
 
+    @transaction.atomic
     def add_recipe(self, model, request, pk):
         recipe = get_object_or_404(Recipe, id=pk)
         if model.objects.filter(
@@ -93,6 +162,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = RecipeListSerializer(recipe)
         return Response(data=serializer.data, status=HTTPStatus.CREATED)
 
+    @transaction.atomic
     def delete_recipe(self, model, request, pk):
         recipe = get_object_or_404(Recipe, id=pk)
         if model.objects.filter(
@@ -109,31 +179,92 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['GET'],
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(AllowAny,),
+    )
+    def trending(self, request):
+        """
+        Рецепты по убыванию популярности за последнее время. Оценки
+        считает фоновый поток; до первого пересчёта список пуст.
+        """
+        trending_job.start()
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            trend__isnull=False,
+        ).order_by('-trend__score', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(AllowAny,),
+    )
+    def by_ingredients(self, request):
+        """
+        Рецепты, которые можно приготовить из указанных ингредиентов.
+        """
+        try:
+            ingredient_ids = {
+                int(value)
+                for param in request.query_params.getlist('ingredients')
+                for value in param.split(',') if value
+            }
+        except ValueError:
+            ingredient_ids = None
+        if not ingredient_ids:
+            return Response(
+                {'errors': 'Укажите id ингредиентов'},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        # Ждём только первого построения индекса; устаревший индекс
+        # отдаётся, пока новый строится в фоне.
+        recipe_ingredient_index.warm_up(
+            background=recipe_ingredient_index.is_loaded,
+        )
+        matches = self.paginate_queryset(
+            recipe_ingredient_index.match(ingredient_ids)
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for _, _, recipe_id in matches]
+        )
+        matches = [match for match in matches if match[2] in recipes]
+        data = self.get_serializer(
+            [recipes[recipe_id] for _, _, recipe_id in matches], many=True,
+        ).data
+        for item, (coverage, missing, _) in zip(data, matches):
+            item['coverage'] = round(coverage, 2)
+            item['missing_count'] = missing
+        return self.get_paginated_response(data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            PlainTextRenderer, CSVRenderer, JSONRenderer, PDFRenderer,
+        ),
     )
     def download_shopping_cart(self, request):
         user = self.request.user
-        file_name = f'{user.username}_shopping_list.txt'
+        file_format = request.accepted_renderer.format
+        etag, last_modified = get_cart_validators(user, file_format)
+        not_modified = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        if not_modified is not None:
+            return set_validators(not_modified, etag, last_modified)
         if not user.shopping_user.exists():
             return Response(status=HTTPStatus.BAD_REQUEST)
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_recipe__user=user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit',
-        ).annotate(
-            amount=Sum('amount')
-        ).order_by('ingredient__name')
-        response = HttpResponse(
-            content_type='text/plain',
-            charset='utf-8',
+        file_name = f'{user.username}_shopping_list.{file_format}'
+        response = StreamingHttpResponse(
+            WRITERS[file_format](get_cart_ingredients(user)),
+            content_type=request.accepted_renderer.media_type,
         )
-        response['Content-Disposition'] = f'attachment; filename={file_name}'
-        response.write('Список продуктов к покупке:\r\n')
-        for ingredient in ingredients:
-            response.write(
-                f'{ingredient["ingredient__name"]} '
-                f'- {ingredient["amount"]} '
-                f'{ingredient["ingredient__measurement_unit"]}\r\n'
+        if request.accepted_renderer.charset:
+            response['Content-Type'] += (
+                f'; charset={request.accepted_renderer.charset}'
             )
-        return response
+        response['Content-Disposition'] = f'attachment; filename={file_name}'
+        return set_validators(response, etag, last_modified)
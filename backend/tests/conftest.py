@@ -0,0 +1,122 @@
+import base64
+
+import pytest
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.search import ingredient_index, recipe_ingredient_index
+from users.models import User
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAC'
+    'hwGA60e6kgAAAABJRU5ErkJggg=='
+)
+IMAGE = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+
+
+@pytest.fixture(autouse=True)
+def isolated(settings, tmp_path):
+    """
+    Кеш и индексы в памяти переживают откат транзакции теста, поэтому
+    сбрасываются перед каждым тестом; файлы пишутся во временный каталог.
+    """
+    settings.MEDIA_ROOT = str(tmp_path)
+    cache.clear()
+    ingredient_index.invalidate()
+    recipe_ingredient_index.invalidate()
+
+
+def create_user(index):
+    return User.objects.create(
+        username=f'user{index}',
+        email=f'user{index}@example.com',
+        first_name=f'Имя {index}',
+        last_name=f'Фамилия {index}',
+        password='password',
+    )
+
+
+@pytest.fixture
+def user(db):
+    return create_user(0)
+
+
+@pytest.fixture
+def authors(db):
+    return [create_user(index) for index in range(1, 4)]
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=slug, slug=slug, color=color)
+        for slug, color in (
+            ('breakfast', '#E26C2D'),
+            ('lunch', '#49B64E'),
+            ('dinner', '#8775D2'),
+        )
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(
+            name=f'ингредиент {index}', measurement_unit='г',
+        )
+        for index in range(60)
+    ]
+
+
+@pytest.fixture
+def make_recipes(authors, tags, ingredients):
+    """
+    Создаёт count рецептов разных авторов с тремя ингредиентами и
+    одним-тремя тегами.
+    """
+    def make(count):
+        recipes = []
+        for index in range(count):
+            recipe = Recipe(
+                name=f'рецепт {index}',
+                author=authors[index % len(authors)],
+                text='текст',
+                cooking_time=10,
+            )
+            recipe.image.save(
+                f'recipe{index}.png', ContentFile(PNG), save=False,
+            )
+            recipe.save()
+            recipe.tags.set(tags[:1 + index % len(tags)])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredients[(index + shift) % len(ingredients)],
+                    amount=shift + 1,
+                )
+                for shift in range(3)
+            )
+            recipes.append(recipe)
+        return recipes
+    return make
+
+
+@pytest.fixture
+def image():
+    return IMAGE
+
+
+@pytest.fixture
+def anonymous_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    token = Token.objects.create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
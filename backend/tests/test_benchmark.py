@@ -0,0 +1,25 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+
+
+def test_tags_filter_latency(db, tmp_path):
+    """
+    Фильтр по тегам не добавляет запросов к базе и не медленнее списка
+    рецептов без фильтра больше чем втрое: сравнение с тем же списком
+    на той же машине не зависит от её скорости.
+    """
+    call_command(
+        'seed_benchmark', users=20, recipes=300, ingredients=100,
+        follows=3, favorites=5, cart=2, stdout=StringIO(),
+    )
+    output = tmp_path / 'benchmark.json'
+    call_command(
+        'benchmark_api', scenarios='recipes,recipes_tags,recipes_tags_all',
+        repeat=30, warmup=10, output=str(output), stdout=StringIO(),
+    )
+    results = json.loads(output.read_text(encoding='utf-8'))['results']
+    for name in ('recipes_tags', 'recipes_tags_all'):
+        assert results[name]['queries'] == results['recipes']['queries']
+        assert results[name]['p95'] < 3 * results['recipes']['p95'] + 5
@@ -0,0 +1,17 @@
+from recipes.models import Ingredient
+
+INGREDIENTS_URL = '/api/ingredients/'
+
+
+def test_name_search_on_cold_index(anonymous_client, db):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit='г')
+        for name in ('варенье', 'вишневое варенье', 'ягодное варенье', 'вода')
+    )
+    url = f'{INGREDIENTS_URL}?name=варенье'
+    expected = ['варенье', 'ягодное варенье', 'вишневое варенье']
+    response = anonymous_client.get(url)
+    assert [item['name'] for item in response.data] == expected
+    response = anonymous_client.get(url)
+    assert response['X-Cache'] == 'HIT'
+    assert [item['name'] for item in response.data] == expected
@@ -0,0 +1,70 @@
+import pytest
+
+from recipes.models import Recipe, RecipeIngredient
+
+RECIPES_URL = '/api/recipes/'
+
+
+@pytest.fixture
+def get_payload(image, tags):
+    def get(ingredients, name='рецепт', amount=1):
+        return {
+            'name': name,
+            'text': 'текст',
+            'cooking_time': 10,
+            'image': image,
+            'tags': [tag.id for tag in tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient in ingredients
+            ],
+        }
+    return get
+
+
+@pytest.mark.parametrize('count', [1, 50])
+def test_create_queries(user_client, ingredients, get_payload, count,
+                        django_assert_num_queries):
+    # Ингредиенты проверяются, сохраняются и попадают в ответ пачками:
+    # число запросов не зависит от их количества.
+    with django_assert_num_queries(26):
+        response = user_client.post(
+            RECIPES_URL, get_payload(ingredients[:count]), format='json',
+        )
+    assert response.status_code == 201
+    assert RecipeIngredient.objects.filter(
+        recipe_id=response.data['id'],
+    ).count() == count
+
+
+@pytest.mark.parametrize('count', [1, 50])
+def test_create_validation_queries(user_client, ingredients, get_payload,
+                                   count, django_assert_num_queries):
+    payload = get_payload(ingredients[:count] + ingredients[:1])
+    payload['ingredients'].append({'id': 10 ** 6, 'amount': 1})
+    # Токен, ингредиенты и теги одним запросом каждые, проверка
+    # уникальности названия.
+    with django_assert_num_queries(4):
+        response = user_client.post(RECIPES_URL, payload, format='json')
+    assert response.status_code == 400
+    assert len(response.data['ingredients']) == 2
+    assert not Recipe.objects.exists()
+
+
+@pytest.mark.parametrize('count', [2, 50])
+def test_update_queries(user_client, ingredients, get_payload, count,
+                        django_assert_num_queries):
+    response = user_client.post(
+        RECIPES_URL, get_payload(ingredients[:count]), format='json',
+    )
+    # Один ингредиент удалён, один добавлен, у остальных новое
+    # количество.
+    payload = get_payload(ingredients[1:count + 1], amount=2)
+    with django_assert_num_queries(30):
+        response = user_client.patch(
+            f'{RECIPES_URL}{response.data["id"]}/', payload, format='json',
+        )
+    assert response.status_code == 200
+    assert [item['amount'] for item in response.data['ingredients']] == (
+        [2] * count
+    )
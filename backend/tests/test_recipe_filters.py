@@ -0,0 +1,138 @@
+import pytest
+
+from recipes.models import FavoriteRecipe, ShoppingList, Tag
+
+RECIPES_URL = '/api/recipes/'
+FAVORITED = {0, 1, 2, 4}
+IN_CART = {1, 2, 3, 5}
+# Рецепт index получает теги tags[:1 + index % 3] и автора
+# authors[index % 3]; фильтр author в наборах ниже — первый автор.
+TAGS = {'breakfast': 0, 'lunch': 1, 'dinner': 2}
+
+
+def matches(index, params):
+    checks = (
+        ('is_favorited', lambda value: (index in FAVORITED) == value),
+        ('is_in_shopping_cart', lambda value: (index in IN_CART) == value),
+        ('author', lambda value: index % 3 == 0),
+        ('tags', lambda value: any(
+            TAGS[slug] <= index % 3 for slug in value
+        )),
+    )
+    return all(
+        check(params[name]) for name, check in checks if name in params
+    )
+
+
+FILTERS = [
+    {'is_favorited': True},
+    {'is_favorited': False},
+    {'is_in_shopping_cart': True},
+    {'is_in_shopping_cart': False},
+    {'tags': ['lunch']},
+    {'tags': ['lunch', 'dinner']},
+    {'author': True},
+    {'is_favorited': True, 'is_in_shopping_cart': True},
+    {'is_favorited': True, 'tags': ['dinner']},
+    {'is_in_shopping_cart': True, 'author': True},
+    {'author': True, 'tags': ['breakfast']},
+    {
+        'is_favorited': True,
+        'is_in_shopping_cart': False,
+        'author': True,
+        'tags': ['breakfast', 'lunch'],
+    },
+]
+
+
+@pytest.fixture
+def recipes(user, make_recipes):
+    recipes = make_recipes(9)
+    FavoriteRecipe.objects.bulk_create(
+        FavoriteRecipe(user=user, recipe=recipes[index])
+        for index in FAVORITED
+    )
+    ShoppingList.objects.bulk_create(
+        ShoppingList(user=user, recipe=recipes[index]) for index in IN_CART
+    )
+    return recipes
+
+
+def get_query(params, author):
+    query = []
+    for name, value in params.items():
+        if name == 'tags':
+            query.extend(('tags', slug) for slug in value)
+        elif name == 'author':
+            query.append(('author', author.id))
+        else:
+            query.append((name, int(value)))
+    return '&'.join(f'{name}={value}' for name, value in query)
+
+
+@pytest.mark.parametrize('params', FILTERS)
+def test_filters(user_client, recipes, authors, params,
+                 django_assert_num_queries):
+    expected = [
+        recipe.id for index, recipe in enumerate(recipes)
+        if matches(index, params)
+    ]
+    assert expected
+    # Токен, число рецептов, страница, теги, ингредиенты, варианты фото,
+    # избранное, список покупок и подписки пользователя. Фильтр по
+    # автору проверяет, что автор существует; фильтр по тегам читает
+    # соответствие слагов id, пока его нет в кеше.
+    with django_assert_num_queries(
+        10 + ('author' in params) + ('tags' in params)
+    ):
+        response = user_client.get(
+            f'{RECIPES_URL}?limit=50&{get_query(params, authors[0])}'
+        )
+    assert response.status_code == 200
+    assert sorted(item['id'] for item in response.data['results']) == (
+        expected
+    )
+
+
+@pytest.mark.parametrize('params', [
+    {'is_favorited': True},
+    {'is_in_shopping_cart': True},
+])
+def test_user_filters_for_anonymous(anonymous_client, recipes, params,
+                                    django_assert_num_queries):
+    # Пустая выборка не выполняется.
+    with django_assert_num_queries(0):
+        response = anonymous_client.get(
+            f'{RECIPES_URL}?{get_query(params, None)}'
+        )
+    assert response.status_code == 200
+    assert response.data['results'] == []
+
+
+def test_tags_filter_uses_cached_slugs(user_client, recipes,
+                                       django_assert_num_queries):
+    user_client.get(f'{RECIPES_URL}?limit=50&tags=breakfast')
+    # Соответствие слагов id и представления рецептов уже в кеше:
+    # токен, число рецептов, страница и отношения пользователя.
+    with django_assert_num_queries(6) as context:
+        response = user_client.get(
+            f'{RECIPES_URL}?limit=50&tags=lunch&tags=dinner'
+        )
+    assert len(response.data['results']) == 6
+    assert not any(
+        '"recipes_tag"' in query['sql']
+        for query in context.captured_queries
+    )
+
+
+def test_tags_filter_reloads_unknown_slug(user_client, recipes):
+    user_client.get(f'{RECIPES_URL}?tags=breakfast')
+    # Тег из другого процесса: сигналы здесь не срабатывают.
+    Tag.objects.bulk_create([
+        Tag(name='snack', slug='snack', color='#FFFFFF'),
+    ])
+    recipes[0].tags.add(Tag.objects.get(slug='snack'))
+    response = user_client.get(f'{RECIPES_URL}?tags=snack')
+    assert [item['id'] for item in response.data['results']] == (
+        [recipes[0].id]
+    )
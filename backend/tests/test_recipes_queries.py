@@ -0,0 +1,70 @@
+import pytest
+
+RECIPES_URL = '/api/recipes/'
+
+
+@pytest.mark.parametrize('count', [1, 6, 12])
+def test_anonymous_list_queries(anonymous_client, make_recipes, count,
+                                django_assert_num_queries):
+    make_recipes(count)
+    # Число рецептов, страница, теги, ингредиенты, варианты фото.
+    with django_assert_num_queries(6):
+        response = anonymous_client.get(RECIPES_URL)
+    assert response.status_code == 200
+    assert len(response.data['results']) == min(count, 6)
+
+
+def test_anonymous_list_cached(anonymous_client, make_recipes,
+                               django_assert_num_queries):
+    make_recipes(6)
+    anonymous_client.get(RECIPES_URL)
+    with django_assert_num_queries(0):
+        response = anonymous_client.get(RECIPES_URL)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('count', [1, 6, 12])
+def test_authenticated_list_queries(user_client, make_recipes, count,
+                                    django_assert_num_queries):
+    make_recipes(count)
+    # Токен, число рецептов, страница, теги, ингредиенты, варианты фото,
+    # избранное, список покупок и подписки пользователя.
+    with django_assert_num_queries(10):
+        response = user_client.get(RECIPES_URL)
+    assert response.status_code == 200
+    assert len(response.data['results']) == min(count, 6)
+
+
+def test_authenticated_list_reuses_cached_recipes(
+    user_client, make_recipes, django_assert_num_queries,
+):
+    make_recipes(6)
+    user_client.get(RECIPES_URL)
+    # Представления рецептов берутся из кеша, запрашиваются только
+    # страница и отношения пользователя к рецептам.
+    with django_assert_num_queries(6):
+        response = user_client.get(RECIPES_URL)
+    assert response.status_code == 200
+
+
+def test_anonymous_detail_queries(anonymous_client, make_recipes,
+                                  django_assert_num_queries):
+    recipe, = make_recipes(1)
+    url = f'{RECIPES_URL}{recipe.id}/'
+    # Рецепт с автором, теги, ингредиенты, варианты фото.
+    with django_assert_num_queries(4):
+        response = anonymous_client.get(url)
+    assert response.status_code == 200
+    with django_assert_num_queries(0):
+        anonymous_client.get(url)
+
+
+def test_authenticated_detail_queries(user_client, make_recipes,
+                                      django_assert_num_queries):
+    recipe, = make_recipes(1)
+    # Токен, рецепт с автором, теги, ингредиенты, варианты фото,
+    # подписки, избранное и список покупок пользователя.
+    with django_assert_num_queries(8):
+        response = user_client.get(f'{RECIPES_URL}{recipe.id}/')
+    assert response.status_code == 200
+    assert response.data['is_favorited'] is False
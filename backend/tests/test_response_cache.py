@@ -0,0 +1,37 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+
+from foodgram import settings
+
+RECIPES_URL = '/api/recipes/'
+
+
+def test_cache_key_includes_host(anonymous_client, make_recipes):
+    recipe, = make_recipes(1)
+    for url in (f'{RECIPES_URL}?limit=1', f'{RECIPES_URL}{recipe.id}/'):
+        anonymous_client.get(url, HTTP_HOST='evil.example')
+        response = anonymous_client.get(url, HTTP_HOST='foodgram.example')
+        assert response['X-Cache'] == 'MISS'
+        assert 'evil.example' not in response.content.decode()
+        assert 'http://foodgram.example/media/' in response.content.decode()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_favorite_refreshes_recipe_and_bounds_list_cache(
+    anonymous_client, user_client, make_recipes,
+):
+    recipe, = make_recipes(1)
+    detail_url = f'{RECIPES_URL}{recipe.id}/'
+    list_url = f'{RECIPES_URL}?ordering=-favorites_count'
+    anonymous_client.get(detail_url)
+    user_client.post(f'{detail_url}favorite/')
+    assert anonymous_client.get(detail_url).data['favorites_count'] == 1
+    with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+        anonymous_client.get(list_url)
+    timeouts = {
+        call[0][2] for call in cache_set.call_args_list
+        if call[0][0].startswith('response:')
+    }
+    assert timeouts == {settings.RECIPE_LIST_CACHE_TIMEOUT}
@@ -0,0 +1,54 @@
+from django.contrib import admin
+
+from recipes.models import RecipeIngredient, ShoppingCartIngredient
+from recipes.shopping_cart import get_live_cart_totals
+from users.models import User
+
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/'
+
+
+def get_stored_totals():
+    return {
+        (total.user_id, total.ingredient_id): total.amount
+        for total in ShoppingCartIngredient.objects.all()
+    }
+
+
+def get_live_totals():
+    return {
+        (row['recipe__shopping_recipe__user'], row['ingredient']):
+            row['total']
+        for row in get_live_cart_totals(User.objects.all())
+    }
+
+
+def test_export_etag_changes_on_ingredient_delete(user_client, make_recipes):
+    recipe, = make_recipes(1)
+    user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    response = user_client.get(DOWNLOAD_URL, HTTP_ACCEPT='text/plain')
+    etag = response['ETag']
+    assert user_client.get(
+        DOWNLOAD_URL, HTTP_ACCEPT='text/plain', HTTP_IF_NONE_MATCH=etag,
+    ).status_code == 304
+    recipe.ingredients.first().delete()
+    response = user_client.get(
+        DOWNLOAD_URL, HTTP_ACCEPT='text/plain', HTTP_IF_NONE_MATCH=etag,
+    )
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+
+def test_admin_recipe_ingredient_changes_update_totals(user_client,
+                                                       make_recipes):
+    recipes = make_recipes(2)
+    for recipe in recipes:
+        user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    model_admin = admin.site._registry[RecipeIngredient]
+    model_admin.delete_model(None, RecipeIngredient.objects.filter(
+        recipe=recipes[0],
+    ).first())
+    assert get_stored_totals() == get_live_totals()
+    model_admin.delete_queryset(None, RecipeIngredient.objects.filter(
+        recipe=recipes[1],
+    ))
+    assert get_stored_totals() == get_live_totals()
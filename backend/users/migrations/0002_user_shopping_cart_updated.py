@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='shopping_cart_updated',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Время последнего изменения списка покупок', null=True, verbose_name='Изменение списка покупок'),
+        ),
+    ]
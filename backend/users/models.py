@@ -54,6 +54,25 @@ class User(AbstractUser):
         null=True,
         help_text='Пароль',
     )
+    shopping_cart_updated = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Изменение списка покупок',
+        help_text='Время последнего изменения списка покупок',
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+        help_text='Количество рецептов автора',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+        help_text='Количество подписчиков',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [
@@ -72,11 +91,11 @@ class User(AbstractUser):
 
     @property
     def is_admin(self):
-        return self.role == self.ADMIN or self.is_staff or self.is_superuser
+        return self.role == ADMIN or self.is_staff or self.is_superuser
 
     @property
     def is_blocked(self):
-        return self.role == self.IS_BLOCKED
+        return self.role == IS_BLOCKED
 
 
 class Follow(models.Model):
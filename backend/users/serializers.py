@@ -1,7 +1,8 @@
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 
-from .models import Follow, User
+from foodgram.relations import get_viewer_relations
+from .models import User
 
 
 class UserCreateSerializer(UserSerializer):
@@ -48,10 +49,16 @@ class UserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(
-            author=obj.id,
-            user=user,
-        ).exists()
+        return get_viewer_relations(self.context).is_subscribed(obj.id)
+
+
+class UserProfileSerializer(UserSerializer):
+    """
+    Сериализатор для страниц пользователей со счётчиками рецептов
+    и подписчиков.
+    """
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + (
+            'recipes_count',
+            'followers_count',
+        )
@@ -1,3 +1,6 @@
+from django.db.models import (
+    OuterRef, Prefetch, Subquery, prefetch_related_objects,
+)
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -5,10 +8,12 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from foodgram import settings
 from foodgram.paginators import PageLimitPagination
+from recipes.models import Recipe
 from recipes.serializers import SubscriptionSerializer
 from .models import User, Follow
-from .serializers import UserCreateSerializer, UserSerializer
+from .serializers import UserCreateSerializer, UserProfileSerializer
 
 
 class UserViewSet(UserViewSet):
@@ -16,14 +21,20 @@ class UserViewSet(UserViewSet):
     Работа с пользователями.
     """
     queryset = User.objects.all()
-    serializer_class = UserSerializer
+    serializer_class = UserProfileSerializer
     permission_classes = (AllowAny, )
     pagination_class = PageLimitPagination
 
+    @property
+    def max_page_size(self):
+        if self.action == 'subscriptions':
+            return settings.SUBSCRIPTIONS_MAX_PAGE_SIZE
+        return settings.MAX_PAGE_SIZE
+
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return UserCreateSerializer
-        return UserSerializer
+        return UserProfileSerializer
 
     @action(
         detail=False,
@@ -32,15 +43,44 @@ class UserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        recipes_limit = self.get_recipes_limit()
+        queryset = Follow.objects.filter(user=user).select_related('author')
         pages = self.paginate_queryset(queryset)
+        prefetch_related_objects(pages, Prefetch(
+            'author__recipes',
+            queryset=self.get_author_recipes(recipes_limit),
+            to_attr='limited_recipes',
+        ))
         serializer = SubscriptionSerializer(
             pages,
             many=True,
-            context={'request': request}
+            context={'request': request, 'recipes_limit': recipes_limit}
         )
         return self.get_paginated_response(serializer.data)
 
+    def get_recipes_limit(self):
+        try:
+            recipes_limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return recipes_limit if recipes_limit >= 0 else None
+
+    @staticmethod
+    def get_author_recipes(recipes_limit):
+        """
+        Последние recipes_limit рецептов каждого автора одним запросом.
+        """
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time', 'author',
+        ).prefetch_related('image_variants')
+        if recipes_limit is None:
+            return recipes
+        return recipes.filter(id__in=Subquery(
+            Recipe.objects.filter(
+                author=OuterRef('author'),
+            ).values('id')[:recipes_limit]
+        ))
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -63,7 +103,10 @@ class UserViewSet(UserViewSet):
             follow = Follow.objects.create(user=user, author=author)
             serializer = SubscriptionSerializer(
                 follow,
-                context={'request': request}
+                context={
+                    'request': request,
+                    'recipes_limit': self.get_recipes_limit(),
+                }
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if user == author:
@@ -71,8 +114,8 @@ class UserViewSet(UserViewSet):
                 {'errors': 'Нельзя отписаться от себя'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        follow = Follow.objects.filter(user=user, author=author)
-        if follow.delete() > 0:
+        deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             return Response(